@@ -1,68 +1,190 @@
 from datetime import datetime
+from typing import Optional
+
+from .artifacts import get_store
+from .history import TestHistory
 
 class AnalyzerAgent:
+    def __init__(self, history: Optional[TestHistory] = None):
+        # cross-run statistics; when set, every analyzed test is recorded and triaged against its past
+        self.history = history
+
     def analyze_run(self, run_id: str, run_metadata: dict, executor_results: list) -> dict:
-        summary = []
+        report = self.start_report(run_id, run_metadata)
         for item in executor_results:
-            tid = item.get("test_id")
-            runs = item.get("runs", [])
-            run_pass = [1 if (r.get("ok") and not r.get("error")) else 0 for r in runs]
-            passes = sum(run_pass)
-            total = len(runs)
-            reproducibility = round(passes / total, 3) if total > 0 else 0.0
-            verdict = "pass" if passes > total / 2 else "fail"
-
-            rep_executor = None
-            for r in runs:
-                if r.get("executor"):
-                    rep_executor = r.get("executor")
-                    break
-
-            triage = []
-            if verdict == "fail":
-                if any(r.get("error") for r in runs):
-                    triage.append("runtime error or selector mismatch — inspect console and error fields")
-                else:
-                    triage.append("non-deterministic failure — consider retrying with different timing")
-            else:
-                if reproducibility < 1.0:
-                    triage.append("flaky: passed on some runs, investigate timing/async issues")
-                else:
-                    triage.append("stable pass")
-
-            artifacts = {}
-            for r in runs:
-                art = r.get("artifacts", {})
-                if art.get("console") and not artifacts.get("console"):
-                    artifacts["console"] = art.get("console")
-                if art.get("screenshot") and not artifacts.get("screenshot"):
-                    artifacts["screenshot"] = art.get("screenshot")
-                if art.get("dom") and not artifacts.get("dom"):
-                    artifacts["dom"] = art.get("dom")
-                if artifacts:
-                    break
-
-            summary.append({
-                "test_id": tid,
-                "verdict": verdict,
-                "reproducibility": reproducibility,
-                "runs_count": total,
-                "passes": passes,
-                "triage": triage,
-                "executor": rep_executor,
-                "artifacts": artifacts
-            })
-
-        stats = {"total": len(summary), "passed": sum(1 for s in summary if s["verdict"] == "pass"), "failed": sum(1 for s in summary if s["verdict"] == "fail")}
-
-        report = {
+            self.add_result(report, item)
+        return self.finish_report(report)
+
+    def start_report(self, run_id: str, run_metadata: dict) -> dict:
+        """Empty report that results are folded into one at a time with add_result()."""
+        return {
             "run_id": run_id,
+            "status": "running",
             "target_url": run_metadata.get("target_url"),
             "generated_at": run_metadata.get("generated_at"),
-            "analyzed_at": datetime.utcnow().isoformat(),
-            "summary": summary,
-            "stats": stats,
+            "analyzed_at": None,
+            "summary": [],
+            "stats": {"total": 0, "passed": 0, "failed": 0, "runs": 0},
+            # per-run latency breakdown across the whole run: {phase: {count, total_ms, mean_ms}}
+            "latency": {"run": {}, "steps": {}, "capture": {}},
+            "manifest": get_store().manifest_path(run_id).as_posix(),
             "notes": ["Analyzer: reproducibility based on repeating each test; triage notes are heuristic."]
         }
 
+    def add_result(self, report: dict, item: dict) -> dict:
+        """Fold one orchestrator result into `report` and return its summary entry."""
+        entry = self.summarize_test(item)
+        if self.history is not None:
+            prior = self.history.record(report.get("target_url"), item.get("test_case") or {},
+                                        item.get("runs", []), report["run_id"], execution_id=report.get("job_id"))
+            entry["triage"].extend(self.history_triage(entry, prior))
+            entry["history"] = {
+                "runs": prior["runs"], "fail_rate": round(prior["fail_rate"], 3),
+                "flake_rate": round(prior["flake_rate"], 3), "p95_ms": prior["p95_ms"]
+            } if prior else None
+        report["summary"].append(entry)
+        stats = report["stats"]
+        stats["total"] += 1
+        stats["passed" if entry["verdict"] == "pass" else "failed"] += 1
+        stats["runs"] = stats.get("runs", 0) + entry["runs_count"]
+        latency = report.setdefault("latency", {"run": {}, "steps": {}, "capture": {}})
+        for r in item.get("runs", []):
+            if r.get("duration_ms") is not None:
+                self._accumulate(latency["run"], "duration", r["duration_ms"])
+            for t in r.get("step_timings") or []:
+                for phase in ("action_ms", "resolve_ms", "settle_ms"):
+                    if t.get(phase) is not None:
+                        self._accumulate(latency["steps"], f"{t.get('action')}.{phase[:-3]}", t[phase])
+            for phase, ms in (r.get("capture_timings") or {}).items():
+                if ms:
+                    self._accumulate(latency["capture"], phase[:-3], ms)
+        return entry
+
+    @staticmethod
+    def _accumulate(totals: dict, key: str, ms: float):
+        slot = totals.setdefault(key, {"count": 0, "total_ms": 0.0, "mean_ms": 0.0})
+        slot["count"] += 1
+        slot["total_ms"] = round(slot["total_ms"] + ms, 1)
+        slot["mean_ms"] = round(slot["total_ms"] / slot["count"], 1)
+
+    def finish_report(self, report: dict, order: list = None) -> dict:
+        """Mark the report complete; `order` (test ids) restores plan order after streaming."""
+        if order:
+            rank = {tid: n for n, tid in enumerate(order)}
+            report["summary"].sort(key=lambda s: rank.get(s["test_id"], len(rank)))
+        report["status"] = "complete"
+        report["analyzed_at"] = datetime.utcnow().isoformat()
         return report
+
+    @staticmethod
+    def history_triage(entry: dict, prior: Optional[dict]) -> list:
+        """Triage notes from this test's earlier runs on the same target."""
+        if not prior or not prior["runs"]:
+            return []
+        notes = []
+        if entry["verdict"] == "fail" and prior["failures"] == 0 and prior["runs"] >= 3:
+            notes.append(f"regression: passed all {prior['runs']} earlier runs (last seen {prior['last_seen'][:10]})")
+        elif entry["verdict"] == "fail" and prior["fail_rate"] >= 0.8:
+            notes.append(f"known failure: failed {prior['failures']}/{prior['runs']} earlier runs")
+        if prior["flake_rate"] >= 0.2:
+            notes.append(f"historically flaky: repeats disagreed in {prior['flaky']}/{prior['analyses']} earlier analyses")
+        return notes
+
+    def summarize_test(self, item: dict) -> dict:
+        tid = item.get("test_id")
+        runs = item.get("runs", [])
+        run_pass = [1 if (r.get("ok") and not r.get("error")) else 0 for r in runs]
+        passes = sum(run_pass)
+        total = len(runs)
+        reproducibility = round(passes / total, 3) if total > 0 else 0.0
+        verdict = "pass" if passes > total / 2 else "fail"
+
+        rep_executor = None
+        for r in runs:
+            if r.get("executor"):
+                rep_executor = r.get("executor")
+                break
+
+        triage = []
+        if verdict == "fail":
+            if any(r.get("error") for r in runs):
+                triage.append("runtime error or selector mismatch — inspect console and error fields")
+            else:
+                triage.append("non-deterministic failure — consider retrying with different timing")
+        else:
+            if reproducibility < 1.0:
+                triage.append("flaky: passed on some runs, investigate timing/async issues")
+            else:
+                triage.append("stable pass")
+
+        # console errors and uncaught page exceptions (counted after level filtering / rate limiting)
+        console_errors = sum((r.get("console") or {}).get("errors", 0) for r in runs)
+        if console_errors:
+            last_error = next((r["console"]["last_error"] for r in reversed(runs)
+                               if (r.get("console") or {}).get("last_error")), "")
+            triage.append(f"{console_errors} console/page error(s) across runs; last: {last_error[:200]}")
+
+        # adaptive repeats: how the orchestrator decided to stop, and whether that settled the verdict
+        stopped = (item.get("repeats") or {}).get("stopped")
+        if stopped in ("max_repeats", "budget"):
+            triage.append(f"verdict not statistically settled after {total} runs (stopped: {stopped})")
+
+        # artifact values are run-manifest keys; keep only those the manifest can resolve
+        artifacts = {}
+        for r in runs:
+            entries = r.get("manifest") or {}
+            art = {k: v for k, v in (r.get("artifacts") or {}).items() if v in entries}
+            if art.get("console") and not artifacts.get("console"):
+                artifacts["console"] = art.get("console")
+            if art.get("screenshot") and not artifacts.get("screenshot"):
+                artifacts["screenshot"] = art.get("screenshot")
+            if art.get("dom") and not artifacts.get("dom"):
+                artifacts["dom"] = art.get("dom")
+            if artifacts:
+                break
+
+        # mean settle time per action across repeats, to show where step time goes
+        settle_totals = {}
+        for r in runs:
+            for t in r.get("step_timings") or []:
+                settle_totals.setdefault(t.get("action"), []).append(t.get("settle_ms", 0.0))
+        settle_ms = {a: round(sum(v) / len(v), 1) for a, v in settle_totals.items()}
+
+        # mean per-run latency breakdown: where a test's time went (steps by phase, capture by phase)
+        def mean(values):
+            return round(sum(values) / len(values), 1) if values else None
+
+        step_phases, capture_phases = {}, {}
+        for r in runs:
+            for t in r.get("step_timings") or []:
+                for phase in ("ms", "action_ms", "resolve_ms"):
+                    if t.get(phase) is not None:
+                        step_phases.setdefault(t.get("action"), {}).setdefault(phase, []).append(t[phase])
+            for phase, ms in (r.get("capture_timings") or {}).items():
+                capture_phases.setdefault(phase, []).append(ms)
+        latency = {
+            "run_ms": mean([r["duration_ms"] for r in runs if r.get("duration_ms") is not None]),
+            "steps_ms": {a: {p: mean(v) for p, v in phases.items()} for a, phases in step_phases.items()},
+            "capture_ms": {p: mean(v) for p, v in capture_phases.items()}
+        }
+
+        # first error seen across repeats, as a short searchable line
+        error = next((str(r["error"]).strip() for r in runs if r.get("error")), None)
+        if error:
+            error = error.splitlines()[0][:300]
+
+        return {
+            "test_id": tid,
+            "description": (item.get("test_case") or {}).get("description"),
+            "verdict": verdict,
+            "reproducibility": reproducibility,
+            "runs_count": total,
+            "passes": passes,
+            "stopped": stopped,
+            "triage": triage,
+            "error": error,
+            "executor": rep_executor,
+            "settle_ms": settle_ms,
+            "latency": latency,
+            "artifacts": artifacts
+        }
@@ -0,0 +1,300 @@
+# agents/artifacts.py
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Optional
+
+CAPTURE_POLICIES = ("always", "on-failure", "first-repeat", "sampled")
+
+RUNS_DIR = Path("reports") / "runs"
+BLOBS_DIR = Path("reports") / "blobs"
+THUMBNAILS_DIR = Path("reports") / "thumbnails"
+# formats that are already compressed and gain nothing from gzip
+_PRECOMPRESSED = (".png", ".jpg", ".jpeg", ".webp", ".webm", ".gz")
+
+
+def should_capture(policy: str, failed: bool, repeat: int, key: str = "", sample_rate: float = 0.1) -> bool:
+    """
+    Decide whether a run keeps its artifacts. Failing runs are always captured;
+    for passing runs:
+    - always:       every run
+    - on-failure:   never
+    - first-repeat: only repeat 0 of each test
+    - sampled:      a stable `sample_rate` fraction, chosen by hashing `key`
+    """
+    if policy not in CAPTURE_POLICIES:
+        raise ValueError(f"unknown capture policy {policy!r}, expected one of {CAPTURE_POLICIES}")
+    if failed or policy == "always":
+        return True
+    if policy == "first-repeat":
+        return repeat == 0
+    if policy == "sampled":
+        bucket = int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:4], "big") / 2 ** 32
+        return bucket < sample_rate
+    return False
+
+
+class ArtifactStore:
+    """
+    Content-addressed artifact storage. Each unique payload is stored once under
+    blobs/<sha256[:2]>/<sha256>[.gz] (gzip unless the format is already compressed),
+    and every run keeps a small runs/<run_id>/manifest.json mapping artifact keys
+    such as "t1/r0/dom.html" to blob entries.
+    """
+
+    def __init__(self, root=BLOBS_DIR, runs_dir=RUNS_DIR, thumbnails_dir=THUMBNAILS_DIR):
+        self.root = Path(root)
+        self.runs_dir = Path(runs_dir)
+        self.thumbnails_dir = Path(thumbnails_dir)
+        self.bytes_written = 0
+        self._manifest_lock = threading.Lock()
+        # run_id -> ((mtime_ns, size), entries); saves re-parsing the manifest for every artifact request
+        self._manifest_cache = {}
+
+    def blob_path(self, digest: str, encoding: str) -> Path:
+        suffix = ".gz" if encoding == "gzip" else ""
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def put(self, name: str, data: bytes) -> dict:
+        digest = hashlib.sha256(data).hexdigest()
+        encoding = "identity" if name.lower().endswith(_PRECOMPRESSED) else "gzip"
+        path = self.blob_path(digest, encoding)
+        if not path.exists():
+            payload = gzip.compress(data, compresslevel=6, mtime=0) if encoding == "gzip" else data
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write-then-rename so concurrent writers of the same blob never expose a partial file
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(payload)
+            os.replace(tmp, path)
+            self.bytes_written += len(payload)
+        return {"sha256": digest, "size": len(data), "encoding": encoding}
+
+    def put_file(self, name: str, source, remove: bool = True) -> dict:
+        """Like `put`, but streams `source` from disk in chunks instead of holding it in memory."""
+        source = Path(source)
+        if not source.exists():
+            return self.put(name, b"")
+        encoding = "identity" if name.lower().endswith(_PRECOMPRESSED) else "gzip"
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f"incoming.{os.getpid()}.{threading.get_ident()}.tmp"
+        hasher = hashlib.sha256()
+        size = 0
+        with open(source, "rb") as src, open(tmp, "wb") as raw:
+            out = gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=6, mtime=0) \
+                if encoding == "gzip" else raw
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                hasher.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+            if out is not raw:
+                out.close()
+        digest = hasher.hexdigest()
+        path = self.blob_path(digest, encoding)
+        if path.exists():
+            tmp.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.bytes_written += tmp.stat().st_size
+            os.replace(tmp, path)
+        if remove:
+            source.unlink()
+        return {"sha256": digest, "size": size, "encoding": encoding}
+
+    def read(self, entry: dict) -> bytes:
+        data = self.blob_path(entry["sha256"], entry.get("encoding", "gzip")).read_bytes()
+        return gzip.decompress(data) if entry.get("encoding", "gzip") == "gzip" else data
+
+    def read_range(self, entry: dict, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """`length` bytes of the payload from `offset`; gzip blobs are only decompressed up to the end of the range."""
+        encoding = entry.get("encoding", "gzip")
+        path = self.blob_path(entry["sha256"], encoding)
+        with (gzip.open(path, "rb") if encoding == "gzip" else open(path, "rb")) as f:
+            if offset:
+                f.seek(offset)
+            return f.read(-1 if length is None else length)
+
+    def manifest_path(self, run_id: str) -> Path:
+        return self.runs_dir / run_id / "manifest.json"
+
+    @staticmethod
+    def _read_manifest(path: Path) -> dict:
+        if not path.exists():
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("artifacts", {})
+
+    def load_manifest(self, run_id: str) -> dict:
+        path = self.manifest_path(run_id)
+        try:
+            stat = path.stat()
+        except OSError:
+            return {}
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._manifest_cache.get(run_id)
+        if cached is not None and cached[0] == version:
+            return dict(cached[1])
+        entries = self._read_manifest(path)
+        if len(self._manifest_cache) >= 32:
+            self._manifest_cache.pop(next(iter(self._manifest_cache)))
+        self._manifest_cache[run_id] = (version, entries)
+        return dict(entries)
+
+    def write_manifest(self, run_id: str, entries: dict):
+        """Merge `entries` into the run's manifest."""
+        with self._manifest_lock:
+            # always merge into what is on disk, never into the read cache
+            merged = self._read_manifest(self.manifest_path(run_id))
+            merged.update(entries)
+            path = self.manifest_path(run_id)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"manifest.json.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"run_id": run_id, "artifacts": merged}, f, indent=2, sort_keys=True)
+            os.replace(tmp, path)
+
+    def _legacy_path(self, key: str) -> Optional[Path]:
+        legacy = Path(key)
+        if legacy.is_file() and self.runs_dir.resolve() in legacy.resolve().parents:
+            return legacy
+        return None
+
+    def open_artifact(self, run_id: str, key: str) -> Optional[bytes]:
+        """Resolve an artifact key through the run manifest; plain file paths from older runs still work."""
+        entry = self.load_manifest(run_id).get(key)
+        if entry is not None:
+            return self.read(entry)
+        legacy = self._legacy_path(key)
+        return legacy.read_bytes() if legacy is not None else None
+
+    def open_artifact_range(self, run_id: str, key: str, offset: int = 0,
+                            length: Optional[int] = None) -> Optional[tuple]:
+        """(bytes, total size) for part of an artifact; a negative `offset` counts from the end."""
+        entry = self.load_manifest(run_id).get(key)
+        legacy = self._legacy_path(key) if entry is None else None
+        if entry is None and legacy is None:
+            return None
+        size = entry["size"] if entry is not None else legacy.stat().st_size
+        start = max(0, size + offset) if offset < 0 else min(offset, size)
+        if entry is not None:
+            return self.read_range(entry, start, length), size
+        with open(legacy, "rb") as f:
+            f.seek(start)
+            return f.read(-1 if length is None else length), size
+
+    def thumbnail(self, run_id: str, key: str, width: int = 320) -> Optional[bytes]:
+        """
+        JPEG thumbnail of an image artifact, `width` pixels wide. Generated once per
+        screenshot content and width, then served from thumbnails/<sha256[:2]>/.
+        """
+        entry = self.load_manifest(run_id).get(key)
+        if entry is not None:
+            digest, load = entry["sha256"], lambda: self.read(entry)
+        else:
+            legacy = self._legacy_path(key)
+            if legacy is None:
+                return None
+            data = legacy.read_bytes()
+            digest, load = hashlib.sha256(data).hexdigest(), lambda: data
+        path = self.thumbnails_dir / digest[:2] / f"{digest}_{width}.jpg"
+        if path.exists():
+            return path.read_bytes()
+
+        from PIL import Image  # only needed to build missing thumbnails
+
+        with Image.open(io.BytesIO(load())) as image:
+            # full-page screenshots are tall; keep the aspect ratio but cap the height
+            image.thumbnail((width, width * 3))
+            out = io.BytesIO()
+            image.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+        thumb = out.getvalue()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(thumb)
+        os.replace(tmp, path)
+        return thumb
+
+
+class ArtifactWriter:
+    """
+    Runs artifact I/O on a background thread so disk writes never block the event loop.
+    Jobs run in submission order; `submit` returns a future for callers that need the result.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._drain, name="artifact-writer", daemon=True)
+        self._thread.start()
+        self.bytes_written = 0
+        self.errors = 0
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def write_bytes(self, path, data: bytes):
+        self.submit(self._write, Path(path), "wb", data)
+
+    def write_text(self, path, text: str):
+        self.submit(self._write, Path(path), "wb", text.encode("utf-8"))
+
+    def append_text(self, path, text: str):
+        self.submit(self._write, Path(path), "ab", text.encode("utf-8"))
+
+    def flush_sync(self):
+        self._queue.join()
+
+    async def flush(self):
+        await asyncio.to_thread(self._queue.join)
+
+    def _write(self, path: Path, mode: str, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, mode) as f:
+            f.write(data)
+        self.bytes_written += len(data)
+
+    def _drain(self):
+        while True:
+            fn, args, future = self._queue.get()
+            # a caller that stopped waiting cancels its future; the job still runs
+            waited = future.set_running_or_notify_cancel()
+            try:
+                result = fn(*args)
+                if waited:
+                    future.set_result(result)
+            except Exception as e:
+                self.errors += 1
+                if waited:
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+
+_writer = None
+_store = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> ArtifactWriter:
+    """Process-wide writer shared by every executor in this process."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ArtifactWriter()
+        return _writer
+
+
+def get_store() -> ArtifactStore:
+    """Process-wide artifact store rooted at reports/blobs."""
+    global _store
+    with _writer_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
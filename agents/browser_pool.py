@@ -0,0 +1,132 @@
+# agents/browser_pool.py
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+from . import metrics
+
+
+class _BrowserSlot:
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.contexts_served = 0
+
+
+class BrowserPool:
+    """
+    Launches `size` Chromium instances once and hands out fresh, isolated
+    BrowserContexts from them. A browser is relaunched after it has served
+    `max_contexts_per_browser` contexts or when it has disconnected (crash).
+    Each browser serves one context at a time, so throughput scales with `size`.
+    """
+
+    def __init__(self, size: int = 2, max_contexts_per_browser: int = 50, headless: bool = True):
+        self.size = max(1, int(size))
+        self.max_contexts_per_browser = max(1, int(max_contexts_per_browser))
+        self.headless = headless
+        self.launches = 0
+        self.recycles = 0
+        self._pw = None
+        self._slots = []
+        self._idle = None
+        self._started = False
+
+    @property
+    def in_use(self) -> int:
+        if not self._started:
+            return 0
+        return self.size - self._idle.qsize()
+
+    async def start(self):
+        if self._started:
+            return self
+        self._pw = await async_playwright().start()
+        self._idle = asyncio.Queue()
+        self._slots = [_BrowserSlot(i) for i in range(self.size)]
+        launched = await asyncio.gather(*(self._launch(slot) for slot in self._slots), return_exceptions=True)
+        errors = [e for e in launched if isinstance(e, BaseException)]
+        if errors:
+            # not started, so close() would skip this: shut down what did launch and the driver
+            for slot in self._slots:
+                await self._close_browser(slot)
+            try:
+                await self._pw.stop()
+            except Exception:
+                pass
+            self._pw = None
+            raise errors[0]
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+        self._started = True
+        metrics.POOL_BROWSERS.inc(self.size)
+        return self
+
+    async def close(self):
+        if not self._started:
+            return
+        self._started = False
+        metrics.POOL_BROWSERS.dec(self.size)
+        for slot in self._slots:
+            await self._close_browser(slot)
+        try:
+            await self._pw.stop()
+        except Exception:
+            pass
+        self._pw = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def context(self, **context_kwargs):
+        """Lease a browser and yield a new BrowserContext on it; the context is closed on exit."""
+        if not self._started:
+            await self.start()
+        slot = await self._idle.get()
+        metrics.POOL_IN_USE.inc()
+        try:
+            if slot.browser is None or not slot.browser.is_connected():
+                await self._recycle(slot)
+            try:
+                context = await slot.browser.new_context(**context_kwargs)
+            except Exception:
+                # browser died between leases; relaunch once and retry
+                await self._recycle(slot)
+                context = await slot.browser.new_context(**context_kwargs)
+            slot.contexts_served += 1
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            if slot.contexts_served >= self.max_contexts_per_browser or not slot.browser.is_connected():
+                await self._recycle(slot)
+        finally:
+            metrics.POOL_IN_USE.dec()
+            self._idle.put_nowait(slot)
+
+    async def _launch(self, slot: _BrowserSlot):
+        slot.browser = await self._pw.chromium.launch(headless=self.headless)
+        slot.contexts_served = 0
+        self.launches += 1
+        metrics.BROWSER_LAUNCHES.inc()
+
+    async def _recycle(self, slot: _BrowserSlot):
+        await self._close_browser(slot)
+        self.recycles += 1
+        metrics.BROWSER_RECYCLES.inc()
+        await self._launch(slot)
+
+    async def _close_browser(self, slot: _BrowserSlot):
+        try:
+            if slot.browser:
+                await slot.browser.close()
+        except Exception:
+            pass
+        slot.browser = None
@@ -0,0 +1,127 @@
+# agents/console_capture.py
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+# Playwright console message types (plus "pageerror" for uncaught exceptions) by severity
+_SEVERITY = {
+    "debug": 0, "trace": 0, "profile": 0, "profileEnd": 0, "count": 0, "timeEnd": 0,
+    "log": 1, "info": 1, "dir": 1, "dirxml": 1, "table": 1, "clear": 1,
+    "startGroup": 1, "startGroupCollapsed": 1, "endGroup": 1,
+    "warning": 2, "warn": 2,
+    "error": 3, "assert": 3, "pageerror": 3
+}
+CONSOLE_LEVELS = ("debug", "log", "warning", "error")
+MAX_LINE_CHARS = 4000
+
+
+class ConsoleCapture:
+    """
+    Bounded console/page-error capture for one run. Accepted lines are buffered and
+    appended to `part_path` through the artifact writer every `flush_bytes` or
+    `flush_interval` seconds, so memory stays flat on chatty pages and a crash
+    still leaves the log on disk. Messages below `min_level` are dropped, each
+    message type is rate-limited to `rate_limit` per second (bursts up to twice that;
+    suppressed counts are logged), and only the last `tail_size` lines are kept in
+    memory for triage.
+    """
+
+    def __init__(self, part_path, writer, min_level: str = "debug", rate_limit: Optional[float] = 100.0,
+                 tail_size: int = 50, flush_bytes: int = 64 * 1024, flush_interval: float = 0.5):
+        if min_level not in CONSOLE_LEVELS:
+            raise ValueError(f"unknown console level {min_level!r}, expected one of {CONSOLE_LEVELS}")
+        self.part_path = Path(part_path)
+        self.writer = writer
+        self.min_severity = _SEVERITY[min_level]
+        self.rate_limit = rate_limit
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.tail = deque(maxlen=tail_size)
+        self.lines = 0
+        self.errors = 0
+        self.filtered = 0
+        self.suppressed = 0
+        self.last_error = None
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_flush = time.monotonic()
+        self._buckets = {}  # kind -> [tokens, last refill, suppressed since last accepted]
+        # the name is the same for every attempt at a run; start from an empty file, not a retry's leftovers
+        writer.write_bytes(self.part_path, b"")
+
+    def add(self, kind: str, text: str):
+        """A console message or page error from the page."""
+        severity = _SEVERITY.get(kind, 1)
+        if severity < self.min_severity:
+            self.filtered += 1
+            return
+        if self.rate_limit and not self._allow(kind):
+            self.suppressed += 1
+            return
+        if severity >= 3:
+            self.errors += 1
+            self.last_error = f"[{kind}] {text}"[:MAX_LINE_CHARS]
+        self._emit(f"[{kind}] {text}")
+
+    def note(self, line: str):
+        """An executor-side line ([warn]/[error] ...); never filtered or rate-limited."""
+        self._emit(line)
+
+    def _allow(self, kind: str) -> bool:
+        now = time.monotonic()
+        burst = max(1.0, 2 * self.rate_limit)
+        bucket = self._buckets.get(kind)
+        if bucket is None:
+            bucket = self._buckets[kind] = [burst, now, 0]
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * self.rate_limit)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1.0
+        if bucket[2]:
+            self._emit(f"[capture] suppressed {bucket[2]} {kind} messages (rate limit {self.rate_limit:g}/s)")
+            bucket[2] = 0
+        return True
+
+    def _emit(self, line: str):
+        line = line[:MAX_LINE_CHARS]
+        self.lines += 1
+        self.tail.append(line)
+        self._buffer.append(line + "\n")
+        self._buffered_bytes += len(line) + 1
+        if self._buffered_bytes >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Hand buffered lines to the writer thread (non-blocking)."""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        self.writer.append_text(self.part_path, "".join(self._buffer))
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    def close(self):
+        for kind, bucket in self._buckets.items():
+            if bucket[2]:
+                self._emit(f"[capture] suppressed {bucket[2]} {kind} messages (rate limit {self.rate_limit:g}/s)")
+                bucket[2] = 0
+        self.flush()
+
+    def discard(self):
+        """Drop the on-disk log (after the writer has caught up), e.g. when the capture policy skips this run."""
+        self.writer.submit(_remove, self.part_path)
+
+    def stats(self) -> dict:
+        return {"lines": self.lines, "errors": self.errors, "filtered": self.filtered,
+                "suppressed": self.suppressed, "last_error": self.last_error}
+
+
+def _remove(path: Path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,210 @@
+# agents/embeddings.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+PERSIST_DIR = os.environ.get("RAG_PERSIST_DIR", "knowledge_store")
+# which backend a fresh index is built with; an existing index always keeps its recorded backend
+DEFAULT_BACKEND = os.environ.get("RAG_EMBEDDINGS", "openai")
+BACKEND_FILE = "embedding_backend.json"
+CACHE_FILE = "embedding_cache.sqlite3"
+# touched by scripts/ingest_knowledge.py after every write; a change drops all cached lookups
+INDEX_VERSION_FILE = "index_version"
+BACKENDS = ("openai", "hashing")
+
+# 64-bit FNV-style multiplier for the rolling n-gram hash
+_PRIME = np.uint64(1099511628211)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local, dependency-free embeddings: character n-grams of the lower-cased UTF-8 text are
+    hashed into `dim` signed buckets and the vector is L2-normalised. A whole batch is
+    hashed in one pass over a concatenated byte buffer with NumPy, so throughput is bound
+    by memory bandwidth rather than per-text Python work. Deterministic across processes.
+    """
+
+    def __init__(self, dim: int = 512, ngram_range=(3, 5), batch_size: int = 2048):
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range)
+        self.batch_size = batch_size
+
+    def spec(self) -> dict:
+        return {"backend": "hashing", "dim": self.dim, "ngram_range": list(self.ngram_range)}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out = []
+        for start in range(0, len(texts), self.batch_size):
+            out.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = [t.lower().encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        owner = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        counts = np.zeros(len(texts) * self.dim, dtype=np.float64)
+
+        with np.errstate(over="ignore"):
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                if len(buf) < n:
+                    break
+                m = len(buf) - n + 1
+                h = np.full(m, np.uint64(14695981039346656037))
+                for i in range(n):
+                    h = (h ^ buf[i:i + m]) * _PRIME
+                # drop n-grams that straddle two texts
+                valid = owner[:m] == owner[n - 1:]
+                h, who = h[valid], owner[:m][valid]
+                bucket = (h % np.uint64(self.dim)).astype(np.int64)
+                sign = np.where((h >> np.uint64(63)) == 1, -1.0, 1.0)
+                counts += np.bincount(who * self.dim + bucket, weights=sign, minlength=counts.size)
+
+        vectors = counts.reshape(len(texts), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps another Embeddings with a persistent SQLite cache keyed by sha256(text) and
+    namespaced by the backend spec, so re-ingesting unchanged text never re-embeds it.
+    Misses are embedded in batches of `batch_size`.
+    """
+
+    def __init__(self, inner: Embeddings, path: str, namespace: str, batch_size: int = 1024):
+        self.inner = inner
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (namespace TEXT, text_hash TEXT, vector BLOB, "
+            "PRIMARY KEY (namespace, text_hash))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes: list) -> dict:
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE namespace = ? "
+                    f"AND text_hash IN ({','.join('?' * len(part))})",
+                    (self.namespace, *part)
+                ).fetchall()
+                found.update((h, np.frombuffer(v, dtype=np.float32).tolist()) for h, v in rows)
+        return found
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(t) for t in texts]
+        found = self._lookup(list(set(hashes)))
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in found:
+                missing.setdefault(h, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        items = list(missing.items())
+        for start in range(0, len(items), self.batch_size):
+            part = items[start:start + self.batch_size]
+            vectors = self.inner.embed_documents([text for _, text in part])
+            rows = []
+            for (h, _), vector in zip(part, vectors):
+                found[h] = vector
+                rows.append((self.namespace, h, np.asarray(vector, dtype=np.float32).tobytes()))
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def load_backend(persist_dir: str = PERSIST_DIR) -> Optional[dict]:
+    """Backend spec an index was built with, or None for a new index."""
+    path = os.path.join(persist_dir, BACKEND_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_backend(spec: dict, persist_dir: str = PERSIST_DIR):
+    os.makedirs(persist_dir, exist_ok=True)
+    path = os.path.join(persist_dir, BACKEND_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def index_version(persist_dir: str = PERSIST_DIR) -> int:
+    try:
+        return os.stat(os.path.join(persist_dir, INDEX_VERSION_FILE)).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def bump_index_version(persist_dir: str = PERSIST_DIR):
+    path = os.path.join(persist_dir, INDEX_VERSION_FILE)
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
+    os.replace(path + ".tmp", path)
+
+
+def default_spec(backend: str = DEFAULT_BACKEND) -> dict:
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "hashing":
+        return HashingEmbeddings().spec()
+    return {"backend": "openai", "model": os.environ.get("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")}
+
+
+def build_embeddings(spec: dict) -> Embeddings:
+    if spec["backend"] == "hashing":
+        return HashingEmbeddings(dim=spec["dim"], ngram_range=spec["ngram_range"])
+    if spec["backend"] == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=spec["model"])
+    raise ValueError(f"unknown embedding backend {spec['backend']!r}, expected one of {BACKENDS}")
+
+
+def get_embeddings(persist_dir: str = PERSIST_DIR, spec: Optional[dict] = None,
+                   cache: Optional[bool] = None) -> Embeddings:
+    """
+    Embeddings matching how the index in `persist_dir` was built. Indexes from before the
+    backend was recorded were built with OpenAI. `spec` overrides this (used when rebuilding).
+    Remote backends are wrapped in CachedEmbeddings unless `cache` is False; the local
+    hashing backend is faster to recompute than to look up, so it is only cached on request.
+    """
+    if spec is None:
+        spec = load_backend(persist_dir)
+        if spec is None:
+            spec = default_spec("openai") if os.path.isdir(persist_dir) and os.listdir(persist_dir) else default_spec()
+    embeddings = build_embeddings(spec)
+    if cache is None:
+        cache = spec["backend"] != "hashing"
+    if not cache:
+        return embeddings
+    namespace = json.dumps(spec, sort_keys=True)
+    return CachedEmbeddings(embeddings, os.path.join(persist_dir, CACHE_FILE), namespace)
@@ -1,53 +1,223 @@
 import asyncio
+import re
+from contextlib import asynccontextmanager
 from datetime import datetime
-from pathlib import Path
+from typing import Optional
 from playwright.async_api import async_playwright
 import traceback
 
-OUT_DIR = Path("reports") / "runs"
+from .artifacts import CAPTURE_POLICIES, get_store, get_writer, should_capture
+from .console_capture import CONSOLE_LEVELS, ConsoleCapture
+
+SETTLE_MODES = ("fixed", "adaptive")
+
+# Records the time of the last DOM mutation so the executor can tell when the page has gone quiet.
+_MUTATION_PROBE = """
+(() => {
+    window.__lastMutationAt = performance.now();
+    new MutationObserver(() => { window.__lastMutationAt = performance.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+})();
+"""
+
+
+class _SettleTracker:
+    """Tracks in-flight requests for a page; a step is settled once network and DOM are both quiet."""
+
+    def __init__(self, page, quiet_ms: int, timeout_ms: int):
+        self.page = page
+        self.quiet = quiet_ms / 1000.0
+        self.timeout = timeout_ms / 1000.0
+        self.inflight = 0
+        self.last_activity = asyncio.get_running_loop().time()
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+
+    def _started(self, _request):
+        self.inflight += 1
+        self.last_activity = asyncio.get_running_loop().time()
+
+    def _finished(self, _request):
+        self.inflight = max(0, self.inflight - 1)
+        self.last_activity = asyncio.get_running_loop().time()
+
+    async def wait(self) -> bool:
+        """Returns True when the page settled, False when the timeout cut the wait short."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        # the quiet window starts when the step returns, so late-firing requests are still seen
+        self.last_activity = loop.time()
+        while loop.time() < deadline:
+            if self.inflight == 0 and loop.time() - self.last_activity >= self.quiet:
+                dom_idle_ms = await self.page.evaluate(
+                    "() => window.__lastMutationAt === undefined ? -1 : performance.now() - window.__lastMutationAt"
+                )
+                if dom_idle_ms < 0 or dom_idle_ms >= self.quiet * 1000:
+                    return True
+            await asyncio.sleep(min(0.05, max(deadline - loop.time(), 0)))
+        return False
+
 
 class ExecutorAgent:
-    def __init__(self, name: str):
+    def __init__(self, name: str, pool=None, store=None, http_cache=None, selector_resolver=None, settle_mode: str = "fixed", step_delay: float = 0.25,
+                 settle_quiet_ms: int = 150, settle_timeout_ms: int = 3000, selector_timeout: int = 3000,
+                 capture_policy: str = "always", sample_rate: float = 0.1, full_page: bool = True,
+                 console_level: str = "debug", console_rate_limit: Optional[float] = 100.0, console_tail: int = 20):
+        if settle_mode not in SETTLE_MODES:
+            raise ValueError(f"unknown settle mode {settle_mode!r}, expected one of {SETTLE_MODES}")
+        if capture_policy not in CAPTURE_POLICIES:
+            raise ValueError(f"unknown capture policy {capture_policy!r}, expected one of {CAPTURE_POLICIES}")
+        if console_level not in CONSOLE_LEVELS:
+            raise ValueError(f"unknown console level {console_level!r}, expected one of {CONSOLE_LEVELS}")
         self.name = name
+        # optional BrowserPool; without one every run launches its own browser
+        self.pool = pool
+        # content-addressed ArtifactStore; defaults to the process-wide one under reports/blobs
+        self.store = store
+        # optional ResponseCache serving static assets from disk across contexts
+        self.http_cache = http_cache
+        # optional SelectorResolver; remembers which fallback selector matches per page version
+        self.selector_resolver = selector_resolver
+        # "fixed" sleeps step_delay after each step; "adaptive" waits for network + DOM quiet
+        # and falls back to step_delay if the page cannot be probed
+        self.settle_mode = settle_mode
+        self.step_delay = step_delay
+        self.settle_quiet_ms = settle_quiet_ms
+        self.settle_timeout_ms = settle_timeout_ms
+        self.selector_timeout = selector_timeout
+        # which runs keep screenshot/DOM/console artifacts; see artifacts.should_capture
+        self.capture_policy = capture_policy
+        self.sample_rate = sample_rate
+        self.full_page = full_page
+        # console messages below console_level are dropped, each message type is capped at
+        # console_rate_limit per second (None: unlimited), and the last console_tail lines go in the result
+        self.console_level = console_level
+        self.console_rate_limit = console_rate_limit
+        self.console_tail = console_tail
+
+    async def _settle(self, tracker) -> dict:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        mode = self.settle_mode
+        settled = True
+        if tracker is not None:
+            try:
+                settled = await tracker.wait()
+            except Exception:
+                mode = "fixed"
+                await asyncio.sleep(self.step_delay)
+        else:
+            await asyncio.sleep(self.step_delay)
+        return {"settle_mode": mode, "settle_ms": round((loop.time() - started) * 1000, 1), "settled": settled}
+
+    async def _target(self, page, sel: str, page_state: dict) -> Optional[str]:
+        """Selector to act on, or None when the resolver already knows nothing matches."""
+        if self.selector_resolver is None:
+            await page.wait_for_selector(sel, timeout=self.selector_timeout)
+            return sel
+        if page_state.get("version") is None:
+            page_state["version"] = await self.selector_resolver.page_version(page)
+        target = await self.selector_resolver.resolve(page, sel, page_state["version"], self.selector_timeout)
+        if target is not None:
+            await page.wait_for_selector(target, timeout=self.selector_timeout)
+        return target
+
+    async def _new_page(self, context):
+        if self.http_cache is not None:
+            await context.route("**/*", self.http_cache.handle)
+        return await context.new_page()
+
+    @asynccontextmanager
+    async def _open_page(self):
+        if self.pool is not None:
+            async with self.pool.context() as context:
+                yield await self._new_page(context)
+            return
+        async with async_playwright() as pw:
+            browser = await pw.chromium.launch(headless=True)
+            try:
+                context = await browser.new_context()
+                yield await self._new_page(context)
+            finally:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
 
-    async def run_test(self, test_case: dict, run_id: str, timeout: int = 15000) -> dict:
+    async def run_test(self, test_case: dict, run_id: str, timeout: int = 15000, repeat: int = 0) -> dict:
         tid = test_case.get("id", "unknown")
         ts = datetime.utcnow().isoformat()
-        artifact_dir = OUT_DIR / run_id / tid
-        artifact_dir.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        run_started = loop.time()
+        # artifacts are keyed per repeat in the run manifest, e.g. "t1/r0/dom.html"
+        key_prefix = f"{tid}/r{repeat}"
+        writer = get_writer()
+        store = self.store or get_store()
+        sample_key = f"{run_id}/{tid}/{repeat}"
 
-        console_lines = []
-        screenshot_path = artifact_dir / "screenshot.png"
-        dom_path = artifact_dir / "dom.html"
-        debug_path = artifact_dir / "executor_debug.log"
+        # console lines are streamed to a per-run file under the run directory as they arrive
+        # and moved into the blob store at the end (or dropped if the capture policy skips the run)
+        safe_tid = re.sub(r"[^\w.-]", "_", str(tid))
+        console = ConsoleCapture(
+            store.runs_dir / run_id / "console" / f"{safe_tid}.r{repeat}.log.part",
+            writer, min_level=self.console_level, rate_limit=self.console_rate_limit, tail_size=self.console_tail
+        )
+        debug_lines = []
+        step_timings = []
+        # time spent in each capture phase; "store_ms" is time waiting on the artifact writer
+        # across every artifact, so it overlaps "logs_ms" (which covers storing the logs)
+        capture_timings = {"screenshot_ms": 0.0, "dom_ms": 0.0, "logs_ms": 0.0, "store_ms": 0.0}
+        artifacts = {"console": None, "screenshot": None, "dom": None, "debug": None}
+        manifest = {}
+
+        async def keep(kind: str, name: str, data: bytes = None, path=None):
+            # hashing, compression and the blob write all happen on the writer thread;
+            # `path` streams a file (queued after any pending appends to it) instead of `data`
+            key = f"{key_prefix}/{name}"
+            started = loop.time()
+            job = (store.put_file, name, path) if path is not None else (store.put, name, data)
+            manifest[key] = await asyncio.wrap_future(writer.submit(*job))
+            capture_timings["store_ms"] += (loop.time() - started) * 1000
+            artifacts[kind] = key
 
-        page = None
-        browser = None
         ok = False
         err = None
 
         try:
-            async with async_playwright() as pw:
-                browser = await pw.chromium.launch(headless=True)
-                context = await browser.new_context()
-                page = await context.new_page()
+            async with self._open_page() as page:
+                # Collect console messages and uncaught page errors
+                page.on("console", lambda msg: console.add(msg.type, msg.text))
+                page.on("pageerror", lambda exc: console.add("pageerror", str(exc)))
+
+                tracker = None
+                if self.settle_mode == "adaptive":
+                    try:
+                        await page.add_init_script(_MUTATION_PROBE)
+                        tracker = _SettleTracker(page, self.settle_quiet_ms, self.settle_timeout_ms)
+                    except Exception as probe_ex:
+                        console.note(f"[warn] adaptive settle unavailable, using fixed delay: {probe_ex!r}")
 
-                # Collect console messages
-                page.on("console", lambda msg: console_lines.append(f"[{msg.type}] {msg.text}"))
+                # page version for the selector resolver; recomputed after every navigation
+                page_state = {"version": None}
 
                 # Execute test steps
                 try:
                     for step in test_case.get("steps", []):
                         action = step.get("action")
+                        step_started = loop.time()
+                        # selector resolution (fill/click only) is reported separately from the action itself
+                        resolve_ms = None
                         # inside the step loop, replace load handling with this:
                         if action == "load":
                             url = step.get("url")
+                            page_state["version"] = None
                             try:
                                 await page.goto(url, timeout=timeout)
                             except Exception as nav_ex:
                                 # navigation failed (DNS, network, SSL, blocked, etc.)
                                 nav_msg = f"navigation failed for {url}: {repr(nav_ex)}"
-                                console_lines.append(f"[error] {nav_msg}")
+                                console.note(f"[error] {nav_msg}")
                                 # set err so the executor knows this run failed due to unreachable target
                                 err = nav_msg
                                 # continue to next steps (we still try to capture screenshot/DOM later)
@@ -57,84 +227,105 @@ class ExecutorAgent:
                         elif action == "fill":
                             sel = step.get("selector")
                             val = str(step.get("value", ""))
+                            target = sel
                             try:
-                                await page.wait_for_selector(sel, timeout=3000)
-                                await page.fill(sel, val, timeout=timeout)
+                                resolve_started = loop.time()
+                                target = await self._target(page, sel, page_state)
+                                resolve_ms = (loop.time() - resolve_started) * 1000
+                                if target is None:
+                                    console.note(f"[warn] no element matches {sel}")
+                                else:
+                                    await page.fill(target, val, timeout=timeout)
                             except Exception:
                                 # Fallback to JS fill
                                 try:
                                     await page.evaluate(
-                                        f"document.querySelector('{sel}') && (document.querySelector('{sel}').value = `{val}`)"
+                                        """({selector, value}) => {
+                                            const el = document.querySelector(selector);
+                                            if (el) el.value = value;
+                                        }""",
+                                        {"selector": target, "value": val}
                                     )
                                 except Exception:
-                                    console_lines.append(f"[warn] failed to fill {sel}")
+                                    console.note(f"[warn] failed to fill {sel}")
                         elif action == "click":
                             sel = step.get("selector")
                             try:
-                                await page.wait_for_selector(sel, timeout=3000)
-                                await page.click(sel, timeout=timeout)
+                                resolve_started = loop.time()
+                                target = await self._target(page, sel, page_state)
+                                resolve_ms = (loop.time() - resolve_started) * 1000
+                                if target is None:
+                                    console.note(f"[warn] no element matches {sel}")
+                                else:
+                                    await page.click(target, timeout=timeout)
                             except Exception:
-                                console_lines.append(f"[warn] failed to click {sel}")
-                        await asyncio.sleep(0.25)
+                                console.note(f"[warn] failed to click {sel}")
+                        action_ms = (loop.time() - step_started) * 1000 - (resolve_ms or 0.0)
+                        timing = await self._settle(tracker)
+                        timing["action"] = action
+                        if resolve_ms is not None:
+                            timing["resolve_ms"] = round(resolve_ms, 1)
+                        timing["action_ms"] = round(action_ms, 1)
+                        timing["ms"] = round((loop.time() - step_started) * 1000, 1)
+                        step_timings.append(timing)
+                        console.flush()
 
                     ok = True
                 except Exception as e:
                     import traceback
                     err = f"Executor error: {repr(e)}"
-                    console_lines.append(f"[error] {err}")
-                    console_lines.append(traceback.format_exc())
+                    console.note(f"[error] {err}")
+                    console.note(traceback.format_exc().rstrip())
 
-                # ✅ Always try to capture screenshot and DOM
-                if page:
-                    await page.screenshot(path=str(screenshot_path), full_page=True)
-                    dom_path.write_text(await page.content(), encoding="utf-8")
+                # ✅ Capture screenshot and DOM when the policy keeps this run
+                failed = not ok or err is not None
+                if should_capture(self.capture_policy, failed, repeat, sample_key, self.sample_rate):
+                    try:
+                        started = loop.time()
+                        shot = await page.screenshot(full_page=self.full_page)
+                        capture_timings["screenshot_ms"] = (loop.time() - started) * 1000
+                        await keep("screenshot", "screenshot.png", shot)
+                        started = loop.time()
+                        dom = (await page.content()).encode("utf-8")
+                        capture_timings["dom_ms"] = (loop.time() - started) * 1000
+                        await keep("dom", "dom.html", dom)
+                    except Exception as e2:
+                        debug_lines.append(f"[{datetime.utcnow().isoformat()}] failed capture: {e2}")
 
         except Exception as e:
             err = f"Executor error: {e}"
-            console_lines.append(f"[error] {err}")
+            console.note(f"[error] {err}")
 
-        finally:
-            # Fallback artifact capture if main try block failed
-            try:
-                if page:
-                    if not screenshot_path.exists():
-                        await page.screenshot(path=str(screenshot_path), full_page=True)
-                    if not dom_path.exists():
-                        dom_path.write_text(await page.content(), encoding="utf-8")
-            except Exception as e2:
-                with open(debug_path, "a", encoding="utf-8") as df:
-                    df.write(f"[{datetime.utcnow().isoformat()}] failed extra capture: {e2}\n")
-
-            # Cleanup browser
-            try:
-                if browser:
-                    await browser.close()
-            except:
-                pass
-
-            # Always write logs
-            try:
-                (artifact_dir / "console.log").write_text("\n".join(console_lines), encoding="utf-8")
-            except:
-                pass
-            try:
-                with open(debug_path, "a", encoding="utf-8") as df:
-                    df.write(f"[{datetime.utcnow().isoformat()}] ok={ok} err={err}\n")
-            except:
-                pass
+        # Logs go through the same store and follow the same policy
+        failed = not ok or err is not None
+        logs_started = loop.time()
+        try:
+            console.close()
+            if should_capture(self.capture_policy, failed, repeat, sample_key, self.sample_rate):
+                await keep("console", "console.log", path=console.part_path)
+            else:
+                console.discard()
+            if failed or debug_lines:
+                debug_lines.append(f"[{datetime.utcnow().isoformat()}] ok={ok} err={err}")
+                await keep("debug", "executor_debug.log", ("\n".join(debug_lines) + "\n").encode("utf-8"))
+        except Exception as e3:
+            err = err or f"Executor error: failed to store logs: {e3!r}"
+        capture_timings["logs_ms"] = (loop.time() - logs_started) * 1000
 
         result = {
             "test_id": tid,
             "executor": self.name,
+            "repeat": repeat,
             "started_at": ts,
             "verdict": "unknown",
             "ok": ok,
             "error": err,
-            "artifacts": {
-                "console": str((artifact_dir / "console.log").as_posix()) if (artifact_dir / "console.log").exists() else None,
-                "screenshot": str(screenshot_path.as_posix()) if screenshot_path.exists() else None,
-                "dom": str(dom_path.as_posix()) if dom_path.exists() else None,
-                "debug": str(debug_path.as_posix()) if debug_path.exists() else None
-            }
+            "step_timings": step_timings,
+            "duration_ms": round((loop.time() - run_started) * 1000, 1),
+            "capture_timings": {k: round(v, 1) for k, v in capture_timings.items()},
+            "console": console.stats(),
+            "console_tail": list(console.tail),
+            "artifacts": artifacts,
+            "manifest": manifest
         }
         return result
@@ -0,0 +1,242 @@
+# agents/history.py
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from .planner import step_signature
+
+HISTORY_PATH = os.path.join("reports", "history.sqlite3")
+
+# upper bounds (ms) of the per-run latency histogram; one more open-ended bucket follows
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000)
+# weight of the newest analysis in the rolling flake / failure rates
+EWMA_ALPHA = 0.2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_stats (
+    target_url TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    test_id TEXT,
+    description TEXT,
+    analyses INTEGER NOT NULL DEFAULT 0,
+    runs INTEGER NOT NULL DEFAULT 0,
+    passes INTEGER NOT NULL DEFAULT 0,
+    flaky INTEGER NOT NULL DEFAULT 0,
+    flake_rate REAL NOT NULL DEFAULT 0,
+    fail_rate REAL NOT NULL DEFAULT 0,
+    first_seen TEXT,
+    last_seen TEXT,
+    last_run_id TEXT,
+    last_failure TEXT,
+    last_failure_run_id TEXT,
+    last_error TEXT,
+    latency_buckets TEXT NOT NULL,
+    PRIMARY KEY (target_url, signature)
+);
+CREATE INDEX IF NOT EXISTS test_stats_flake ON test_stats (target_url, flake_rate);
+CREATE TABLE IF NOT EXISTS test_daily (
+    day TEXT NOT NULL,
+    target_url TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    analyses INTEGER NOT NULL DEFAULT 0,
+    runs INTEGER NOT NULL DEFAULT 0,
+    passes INTEGER NOT NULL DEFAULT 0,
+    flaky INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, target_url, signature)
+);
+CREATE TABLE IF NOT EXISTS test_recorded (
+    execution_id TEXT NOT NULL,
+    target_url TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    prior TEXT,
+    PRIMARY KEY (execution_id, target_url, signature)
+);
+"""
+
+
+def test_signature(test_case: dict) -> str:
+    """Stable identity of a test across runs (test ids like "t3" are reassigned every plan)."""
+    return step_signature(test_case.get("steps") or []).hex()
+
+
+def _bucket(ms: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+def latency_percentile(buckets: list, q: float) -> Optional[float]:
+    """Upper bound of the bucket holding the q-quantile (the last finite bound for the open bucket)."""
+    total = sum(buckets)
+    if not total:
+        return None
+    seen = 0
+    for i, count in enumerate(buckets):
+        seen += count
+        if seen >= q * total:
+            return float(LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)])
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+class TestHistory:
+    """
+    Cross-run statistics per (target URL, test signature), updated in O(1) per analyzed
+    test: pass/fail counts, how often repeats disagreed, EWMA flake and failure rates,
+    the last failure and a latency histogram. Daily rollups answer windowed questions
+    ("flakiest tests this month") from an index instead of rescanning reports.
+    """
+
+    def __init__(self, db_path: str = HISTORY_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def record(self, target_url: str, test_case: dict, runs: list, run_id: str,
+               analyzed_at: Optional[str] = None, execution_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Fold one analyzed test (all its repeats) into the history; returns the stats from before this run.
+        Idempotent per (execution_id, test), where execution_id (default: run_id) names one execution of
+        the run, e.g. its job: a resumed execution that re-runs a test it already recorded gets the
+        original prior stats back and leaves the history untouched.
+        """
+        if not runs:
+            return None
+        signature = test_signature(test_case)
+        now = analyzed_at or datetime.utcnow().isoformat()
+        passes = sum(1 for r in runs if r.get("ok") and not r.get("error"))
+        total = len(runs)
+        flaky = 1 if 0 < passes < total else 0
+        fail_fraction = 1 - passes / total
+        error = next((str(r["error"]) for r in runs if r.get("error")), None)
+
+        execution_id = execution_id or run_id
+
+        with self._lock, self._conn:
+            recorded = self._conn.execute(
+                "SELECT prior FROM test_recorded WHERE execution_id = ? AND target_url = ? AND signature = ?",
+                (execution_id, target_url, signature)
+            ).fetchone()
+            if recorded is not None:
+                return json.loads(recorded["prior"]) if recorded["prior"] else None
+            row = self._conn.execute(
+                "SELECT * FROM test_stats WHERE target_url = ? AND signature = ?", (target_url, signature)
+            ).fetchone()
+            prior = self._stats(row) if row else None
+            self._conn.execute(
+                "INSERT INTO test_recorded (execution_id, target_url, signature, prior) VALUES (?, ?, ?, ?)",
+                (execution_id, target_url, signature, json.dumps(prior) if prior else None)
+            )
+            buckets = json.loads(row["latency_buckets"]) if row else [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            for r in runs:
+                if r.get("duration_ms") is not None:
+                    buckets[_bucket(r["duration_ms"])] += 1
+            if row:
+                flake_rate = EWMA_ALPHA * flaky + (1 - EWMA_ALPHA) * row["flake_rate"]
+                fail_rate = EWMA_ALPHA * fail_fraction + (1 - EWMA_ALPHA) * row["fail_rate"]
+            else:
+                flake_rate, fail_rate = float(flaky), fail_fraction
+            failed_now = passes < total
+
+            self._conn.execute(
+                """
+                INSERT INTO test_stats (target_url, signature, test_id, description, analyses, runs, passes, flaky,
+                    flake_rate, fail_rate, first_seen, last_seen, last_run_id, last_failure, last_failure_run_id,
+                    last_error, latency_buckets)
+                VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (target_url, signature) DO UPDATE SET
+                    test_id = excluded.test_id,
+                    description = excluded.description,
+                    analyses = analyses + 1,
+                    runs = runs + excluded.runs,
+                    passes = passes + excluded.passes,
+                    flaky = flaky + excluded.flaky,
+                    flake_rate = excluded.flake_rate,
+                    fail_rate = excluded.fail_rate,
+                    last_seen = excluded.last_seen,
+                    last_run_id = excluded.last_run_id,
+                    last_failure = COALESCE(excluded.last_failure, last_failure),
+                    last_failure_run_id = COALESCE(excluded.last_failure_run_id, last_failure_run_id),
+                    last_error = COALESCE(excluded.last_error, last_error),
+                    latency_buckets = excluded.latency_buckets
+                """,
+                (target_url, signature, test_case.get("id"), test_case.get("description"), total, passes, flaky,
+                 flake_rate, fail_rate, now, now, run_id,
+                 now if failed_now else None, run_id if failed_now else None, error, json.dumps(buckets))
+            )
+            self._conn.execute(
+                """
+                INSERT INTO test_daily (day, target_url, signature, analyses, runs, passes, flaky)
+                VALUES (?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT (day, target_url, signature) DO UPDATE SET
+                    analyses = analyses + 1,
+                    runs = runs + excluded.runs,
+                    passes = passes + excluded.passes,
+                    flaky = flaky + excluded.flaky
+                """,
+                (now[:10], target_url, signature, total, passes, flaky)
+            )
+        return prior
+
+    @staticmethod
+    def _stats(row) -> dict:
+        stats = dict(row)
+        buckets = json.loads(stats.pop("latency_buckets"))
+        stats["failures"] = stats["runs"] - stats["passes"]
+        stats["p50_ms"] = latency_percentile(buckets, 0.5)
+        stats["p95_ms"] = latency_percentile(buckets, 0.95)
+        return stats
+
+    def get(self, target_url: str, test_case: dict) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM test_stats WHERE target_url = ? AND signature = ?",
+                (target_url, test_signature(test_case))
+            ).fetchone()
+        return self._stats(row) if row else None
+
+    def flakiest(self, target_url: Optional[str] = None, days: Optional[int] = 30, limit: int = 20,
+                 min_runs: int = 2) -> list:
+        """Tests whose repeats disagreed most often within the last `days` days (all time if None)."""
+        clauses, params = [], []
+        if days is not None:
+            clauses.append("d.day >= ?")
+            params.append((datetime.utcnow() - timedelta(days=days)).date().isoformat())
+        if target_url:
+            clauses.append("d.target_url = ?")
+            params.append(target_url)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT d.target_url, d.signature, s.test_id, s.description, s.flake_rate, s.last_failure,
+                       s.last_error, SUM(d.analyses) AS analyses, SUM(d.runs) AS runs, SUM(d.passes) AS passes,
+                       SUM(d.flaky) AS flaky, CAST(SUM(d.flaky) AS REAL) / SUM(d.analyses) AS window_flake_rate
+                FROM test_daily d JOIN test_stats s USING (target_url, signature)
+                {where}
+                GROUP BY d.target_url, d.signature
+                HAVING SUM(d.runs) >= ? AND SUM(d.flaky) > 0
+                ORDER BY window_flake_rate DESC, runs DESC
+                LIMIT ?
+                """,
+                (*params, min_runs, limit)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def failure_rate(self, target_url: str) -> Callable[[dict], float]:
+        """Ranker feature: rolling failure rate of a candidate's step sequence on `target_url` (0.0 if unseen)."""
+        with self._lock:
+            rates = dict(self._conn.execute(
+                "SELECT signature, fail_rate FROM test_stats WHERE target_url = ?", (target_url,)
+            ).fetchall())
+        if not rates:
+            return lambda candidate: 0.0
+        return lambda candidate: rates.get(test_signature(candidate), 0.0)
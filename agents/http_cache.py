@@ -0,0 +1,214 @@
+# agents/http_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+CACHE_DIR = Path("reports") / "http_cache"
+# sub-resources worth caching; documents and XHR/fetch are always passed through
+CACHEABLE_TYPES = ("script", "stylesheet", "image", "font", "media")
+# the fetched body is already decoded, so these must not be replayed with it
+_ENCODING_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+# never persisted to disk
+_DROPPED_HEADERS = _ENCODING_HEADERS + ("set-cookie",)
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of GET responses for static game assets, installed on each
+    BrowserContext through Playwright request routing. Entries are stored as
+    <sha256(url)>.body + .json under `root`, so every context and worker process
+    shares them. Least-recently-used entries are evicted once the cache grows past
+    `max_bytes`. A hit is served straight from disk only while it is fresh under the
+    response's Cache-Control max-age / Expires (measured from when it was fetched);
+    stale and `no-cache` entries, or every entry with `revalidate`, are confirmed
+    with a conditional request (If-None-Match / If-Modified-Since) and served from
+    disk on 304.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes: int = 512 * 1024 * 1024, revalidate: bool = False,
+                 resource_types=CACHEABLE_TYPES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.revalidate = revalidate
+        self.resource_types = tuple(resource_types)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = self.root / key[:2] / key
+        return base.with_suffix(".json"), base.with_suffix(".body")
+
+    def load(self, url: str) -> Optional[tuple]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        # bump mtime so eviction sees this entry as recently used
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return meta, body
+
+    def store(self, url: str, status: int, headers: dict, body: bytes):
+        meta_path, body_path = self._paths(url)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "url": url,
+            "status": status,
+            "fetched_at": time.time(),
+            "headers": {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS}
+        }
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        # body first, then metadata: an entry only counts once its .json exists
+        tmp = body_path.with_name(body_path.name + suffix)
+        tmp.write_bytes(body)
+        os.replace(tmp, body_path)
+        self._write_meta(meta_path, meta)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            self._size += len(body)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _write_meta(self, meta_path: Path, meta: dict):
+        tmp = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, meta_path)
+
+    def refresh(self, url: str, meta: dict, headers: dict) -> dict:
+        """After a 304: restart the entry's freshness clock and take the origin's updated caching headers."""
+        updated = {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS}
+        meta = dict(meta, fetched_at=time.time(), headers={**meta["headers"], **updated})
+        meta_path, _ = self._paths(url)
+        try:
+            self._write_meta(meta_path, meta)
+        except OSError:
+            pass
+        return meta
+
+    @staticmethod
+    def freshness_lifetime(headers: dict) -> float:
+        """Seconds a response may be reused without revalidation; 0 for no-cache or no explicit lifetime."""
+        directives = {}
+        for part in headers.get("cache-control", "").lower().split(","):
+            name, _, value = part.strip().partition("=")
+            directives[name] = value.strip().strip('"')
+        if "no-cache" in directives or "no-store" in directives:
+            return 0.0
+        if "max-age" in directives:
+            try:
+                return max(0.0, float(directives["max-age"]) - float(headers.get("age") or 0))
+            except ValueError:
+                return 0.0
+        if headers.get("expires"):
+            try:
+                expires = parsedate_to_datetime(headers["expires"])
+                date = parsedate_to_datetime(headers["date"]) if headers.get("date") else None
+                return max(0.0, (expires - date).total_seconds() if date else expires.timestamp() - time.time())
+            except (TypeError, ValueError):
+                return 0.0
+        return 0.0
+
+    def is_fresh(self, meta: dict, now: Optional[float] = None) -> bool:
+        fetched_at = meta.get("fetched_at")
+        if fetched_at is None:
+            # written before entries were timestamped
+            return False
+        return (now or time.time()) - fetched_at < self.freshness_lifetime(meta["headers"])
+
+    def evict(self):
+        """Drop least-recently-used entries until the cache is back under 90% of max_bytes."""
+        entries = []
+        total = 0
+        for meta_path in self.root.glob("*/*.json"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                size = body_path.stat().st_size
+                entries.append((meta_path.stat().st_mtime, size, meta_path, body_path))
+            except OSError:
+                continue
+            total += size
+        entries.sort()
+        target = self.max_bytes * 0.9
+        for _, size, meta_path, body_path in entries:
+            if total <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
+        with self._lock:
+            self._size = total
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self.root.glob("*/*.body") if p.exists())
+
+    @staticmethod
+    def _cacheable(status: int, headers: dict) -> bool:
+        cache_control = headers.get("cache-control", "").lower()
+        return status == 200 and "no-store" not in cache_control and headers.get("vary", "") != "*"
+
+    async def handle(self, route):
+        """Playwright route handler: serve cached assets from disk, fetch and store the rest."""
+        request = route.request
+        if request.method != "GET" or request.resource_type not in self.resource_types:
+            await route.continue_()
+            return
+
+        cached = await asyncio.to_thread(self.load, request.url)
+        if cached and not self.revalidate and self.is_fresh(cached[0]):
+            self.hits += 1
+            meta, body = cached
+            await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            return
+
+        headers = dict(request.headers)
+        if cached:
+            meta, _ = cached
+            if meta["headers"].get("etag"):
+                headers["if-none-match"] = meta["headers"]["etag"]
+            if meta["headers"].get("last-modified"):
+                headers["if-modified-since"] = meta["headers"]["last-modified"]
+
+        try:
+            response = await route.fetch(headers=headers)
+        except Exception:
+            if cached:
+                # origin unreachable: a stale asset beats a broken page
+                meta, body = cached
+                await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            else:
+                await route.abort()
+            return
+
+        if cached and response.status == 304:
+            self.revalidated += 1
+            meta, body = cached
+            meta = await asyncio.to_thread(self.refresh, request.url, meta, response.headers)
+            await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            return
+
+        self.misses += 1
+        body = await response.body()
+        if self._cacheable(response.status, response.headers):
+            await asyncio.to_thread(self.store, request.url, response.status, response.headers, body)
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _ENCODING_HEADERS}
+        await route.fulfill(status=response.status, headers=headers, body=body)
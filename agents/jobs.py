@@ -0,0 +1,205 @@
+# agents/jobs.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+JOBS_PATH = os.path.join("reports", "jobs.sqlite3")
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker_id TEXT,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state_available ON jobs (state, available_at);
+CREATE INDEX IF NOT EXISTS jobs_run ON jobs (run_id);
+"""
+
+
+def _row(row) -> Optional[dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+class JobQueue:
+    """
+    Durable execution queue in SQLite, shared by API processes (which enqueue) and
+    worker processes (which claim). A claimed job holds a lease that its worker renews
+    with heartbeat(); when a worker dies the lease runs out and the job is handed to
+    the next claimer, until `max_attempts` claims have been used up.
+    """
+
+    def __init__(self, db_path: str = JOBS_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit; claims take the write lock explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def enqueue(self, run_id: str, payload: dict, max_attempts: int = 3) -> dict:
+        """Queue a run; a run that already has a queued or running job gets that job back."""
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                active = self._conn.execute(
+                    "SELECT * FROM jobs WHERE run_id = ? AND state IN ('queued', 'running')", (run_id,)
+                ).fetchone()
+                if active is None:
+                    job_id = str(uuid.uuid4())
+                    self._conn.execute(
+                        "INSERT INTO jobs (job_id, run_id, payload, state, max_attempts, available_at, created_at, updated_at) "
+                        "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                        (job_id, run_id, json.dumps(payload), max(1, max_attempts), time.time(), now, now)
+                    )
+                    active = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return _row(active)
+
+    def claim(self, worker_id: str, lease_seconds: float = 60.0) -> Optional[dict]:
+        """Atomically take the oldest runnable job; returns it with `attempts` already counting this claim."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE state = 'queued' AND available_at <= ? "
+                    "ORDER BY available_at, created_at LIMIT 1", (now,)
+                ).fetchone()
+                job = None
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = 'running', attempts = attempts + 1, worker_id = ?, lease_until = ?, "
+                        "updated_at = ? WHERE job_id = ?",
+                        (worker_id, now + lease_seconds, datetime.utcnow().isoformat(), row["job_id"])
+                    )
+                    job = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return _row(job)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = 60.0) -> bool:
+        """Extend the lease; False means the job is no longer ours (lease expired and was reclaimed)."""
+        return self._write(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE job_id = ? AND worker_id = ? AND state = 'running'",
+            (time.time() + lease_seconds, datetime.utcnow().isoformat(), job_id, worker_id)
+        ) > 0
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        return self._write(
+            "UPDATE jobs SET state = 'done', lease_until = NULL, error = NULL, updated_at = ? "
+            "WHERE job_id = ? AND worker_id = ? AND state = 'running'",
+            (datetime.utcnow().isoformat(), job_id, worker_id)
+        ) > 0
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_delay: float = 5.0) -> Optional[str]:
+        """
+        Record a failed attempt. The job is queued again after an exponential backoff
+        (retry_delay * 2^(attempts-1)) while attempts remain; returns the new state,
+        or None if the job was not ours.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._conn.execute(
+                    "SELECT attempts, max_attempts FROM jobs WHERE job_id = ? AND worker_id = ? AND state = 'running'",
+                    (job_id, worker_id)
+                ).fetchone()
+                state = None
+                if job is not None:
+                    state = "queued" if job["attempts"] < job["max_attempts"] else "failed"
+                    self._conn.execute(
+                        "UPDATE jobs SET state = ?, error = ?, lease_until = NULL, available_at = ?, updated_at = ? "
+                        "WHERE job_id = ?",
+                        (state, error, time.time() + retry_delay * 2 ** (job["attempts"] - 1),
+                         datetime.utcnow().isoformat(), job_id)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return state
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Hand a job back without using up an attempt (e.g. the worker is shutting down)."""
+        return self._write(
+            "UPDATE jobs SET state = 'queued', attempts = MAX(attempts - 1, 0), worker_id = NULL, lease_until = NULL, "
+            "available_at = ?, updated_at = ? WHERE job_id = ? AND worker_id = ? AND state = 'running'",
+            (time.time(), datetime.utcnow().isoformat(), job_id, worker_id)
+        ) > 0
+
+    def requeue_stale(self) -> list:
+        """
+        Release running jobs whose lease has expired (their worker died or hung): back to
+        queued while attempts remain, failed otherwise. Returns the released jobs with
+        their new state.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = self._conn.execute(
+                    "SELECT * FROM jobs WHERE state = 'running' AND lease_until < ?", (now,)
+                ).fetchall()
+                released = []
+                for row in stale:
+                    job = _row(row)
+                    job["state"] = "queued" if job["attempts"] < job["max_attempts"] else "failed"
+                    job["error"] = f"lease expired on worker {job['worker_id']}"
+                    self._conn.execute(
+                        "UPDATE jobs SET state = ?, error = ?, lease_until = NULL, available_at = ?, updated_at = ? "
+                        "WHERE job_id = ?",
+                        (job["state"], job["error"], now, datetime.utcnow().isoformat(), job["job_id"])
+                    )
+                    released.append(job)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return released
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return _row(self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    def latest_for_run(self, run_id: str) -> Optional[dict]:
+        with self._lock:
+            return _row(self._conn.execute(
+                "SELECT * FROM jobs WHERE run_id = ? ORDER BY created_at DESC LIMIT 1", (run_id,)
+            ).fetchone())
+
+    def count_by_state(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
@@ -0,0 +1,248 @@
+# agents/metrics.py
+import json
+import math
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+# seconds; wide enough for a settle delay at the low end and a slow navigation at the top
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# worker processes publish their metrics here; the API merges them into /metrics
+SNAPSHOT_DIR = os.path.join("reports", "metrics")
+# gauges from a snapshot older than this belong to a dead worker and are left out
+SNAPSHOT_MAX_AGE = 60.0
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["MetricsRegistry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames and self.kind in ("counter", "gauge"):
+            # unlabelled series are exported as 0 before their first update
+            self._values[()] = 0.0
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def values(self) -> dict:
+        with self._lock:
+            return {key: (dict(value, counts=list(value["counts"])) if isinstance(value, dict) else value)
+                    for key, value in self._values.items()}
+
+    @staticmethod
+    def _add(total, value):
+        if total is None:
+            return value
+        return total + value
+
+    def merged(self, snapshots: list) -> dict:
+        """This process's values plus the same series from other processes' snapshots, summed."""
+        values = self.values()
+        for snapshot in snapshots:
+            if self.kind == "gauge" and snapshot.get("stale"):
+                continue
+            for key, value in snapshot["metrics"].get(self.name, []):
+                key = tuple(key)
+                values[key] = self._add(values.get(key), value)
+        return values
+
+    def samples(self, values: dict = None) -> list:
+        """[(name suffix, label values, extra label text, value)] for rendering."""
+        values = self.values() if values is None else values
+        return [("", key, "", value) for key, value in sorted(values.items())]
+
+    def render(self, snapshots: list = ()) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples(self.merged(snapshots) if snapshots else None):
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, key, extra)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS, registry: Optional["MetricsRegistry"] = None):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @staticmethod
+    def _add(total, value):
+        if total is None:
+            return dict(value, counts=list(value["counts"]))
+        total["counts"] = [a + b for a, b in zip(total["counts"], value["counts"])]
+        total["sum"] += value["sum"]
+        total["count"] += value["count"]
+        return total
+
+    def samples(self, values: dict = None) -> list:
+        values = self.values() if values is None else values
+        out = []
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                out.append(("_bucket", key, f'le="{_number(bound)}"', cumulative))
+            out.append(("_sum", key, "", state["sum"]))
+            out.append(("_count", key, "", state["count"]))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self, snapshots: list = ()) -> str:
+        """Prometheus text exposition format (version 0.0.4), merged with other processes' `snapshots`."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(snapshots))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "written_at": time.time(),
+            "metrics": {m.name: [[list(key), value] for key, value in m.values().items()] for m in self._metrics}
+        }
+
+    def write_snapshot(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+
+def load_snapshots(directory: str = SNAPSHOT_DIR, max_age: float = SNAPSHOT_MAX_AGE) -> list:
+    """
+    Metric snapshots written by other processes. Counters and histograms of a worker
+    that is gone are kept (they are totals); its gauges are flagged stale.
+    """
+    if not os.path.isdir(directory):
+        return []
+    now = time.time()
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if snapshot.get("pid") == os.getpid():
+            continue  # this process's own values are already in the registry
+        snapshot["stale"] = now - snapshot.get("written_at", 0) > max_age
+        snapshots.append(snapshot)
+    return snapshots
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RUNS = Gauge("game_tester_runs", "Runs in the registry by state", ["state"])
+JOBS = Gauge("game_tester_jobs", "Execution jobs in the job queue by state", ["state"])
+EXECUTIONS_IN_PROGRESS = Gauge("game_tester_executions_in_progress", "Executions currently running in worker processes")
+QUEUE_DEPTH = Gauge("game_tester_queue_depth", "Test runs queued for an executor and not yet started")
+POOL_BROWSERS = Gauge("game_tester_browser_pool_browsers", "Browsers held by open BrowserPools")
+POOL_IN_USE = Gauge("game_tester_browser_pool_in_use", "Browsers currently leased to an executor")
+BROWSER_LAUNCHES = Counter("game_tester_browser_launches_total", "Browser launches, including relaunches")
+BROWSER_RECYCLES = Counter("game_tester_browser_recycles_total", "Browser relaunches after max contexts or a crash")
+TESTS = Counter("game_tester_tests_total", "Analyzed tests by verdict", ["verdict"])
+TEST_RUNS = Counter("game_tester_test_runs_total", "Executed test runs (one per repeat) by outcome", ["outcome"])
+TEST_RUN_SECONDS = Histogram("game_tester_test_run_duration_seconds", "Wall time of one test run")
+STEP_SECONDS = Histogram("game_tester_step_duration_seconds", "Step latency by action and phase", ["action", "phase"])
+CAPTURE_SECONDS = Histogram("game_tester_capture_duration_seconds", "Artifact capture latency by phase", ["phase"])
+
+
+def observe_result(item: dict, verdict: Optional[str] = None):
+    """Record one orchestrator result (all repeats of a test) in the run/step/capture metrics."""
+    if verdict:
+        TESTS.inc(verdict=verdict)
+    for run in item.get("runs", []):
+        TEST_RUNS.inc(outcome="pass" if run.get("ok") and not run.get("error") else "fail")
+        if run.get("duration_ms") is not None:
+            TEST_RUN_SECONDS.observe(run["duration_ms"] / 1000)
+        for timing in run.get("step_timings") or []:
+            action = timing.get("action") or "unknown"
+            for phase in ("ms", "action_ms", "resolve_ms", "settle_ms"):
+                if timing.get(phase) is not None:
+                    STEP_SECONDS.observe(timing[phase] / 1000, action=action,
+                                         phase="total" if phase == "ms" else phase[:-3])
+        for phase, ms in (run.get("capture_timings") or {}).items():
+            if ms:
+                CAPTURE_SECONDS.observe(ms / 1000, phase=phase[:-3])
@@ -1,20 +1,368 @@
 import asyncio
+import atexit
+import multiprocessing
+import math
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Optional
+from . import metrics
+from .artifacts import get_store, get_writer
+from .browser_pool import BrowserPool
 from .executor import ExecutorAgent
+from .http_cache import ResponseCache
+from .selector_resolver import SelectorResolver
+
+EXECUTION_MODES = ("async", "process")
+REPEAT_MODES = ("fixed", "adaptive")
+
+
+def repeat_decision(passes: int, runs: int, confidence: float = 0.95) -> Optional[str]:
+    """
+    Sequential stopping rule for adaptive repeats. Returns why the verdict is settled
+    ("unanimous" or "confident"), or None if more runs are needed. A split test is
+    settled once the Wilson interval of its pass rate excludes 0.5 at `confidence`.
+    """
+    if runs == 0:
+        return None
+    if passes in (0, runs):
+        return "unanimous"
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = passes / runs
+    centre = (rate + z * z / (2 * runs)) / (1 + z * z / runs)
+    margin = z * math.sqrt(rate * (1 - rate) / runs + z * z / (4 * runs * runs)) / (1 + z * z / runs)
+    if centre - margin > 0.5 or centre + margin < 0.5:
+        return "confident"
+    return None
+
+
+# (event loop, orchestrator) of a shard worker process, built once by _init_shard_worker
+_shard_worker = None
+# seconds between metric snapshots of a shard worker process (see metrics.load_snapshots)
+SHARD_SNAPSHOT_INTERVAL = 5.0
+
+
+def _init_shard_worker(options: dict):
+    # runs once per worker process: the loop, BrowserPool, response cache and selector
+    # resolver it sets up are reused by every shard the process is handed
+    global _shard_worker
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    orchestrator = OrchestratorAgent(**options)
+    orchestrator.pool = BrowserPool(size=orchestrator.pool_size,
+                                    max_contexts_per_browser=orchestrator.max_contexts_per_browser)
+    # the parent counts a shard's runs as queued until the shard comes back; counting them here too
+    # would double them once this process's snapshot is merged into /metrics
+    orchestrator.queue_depth = metrics.Gauge(metrics.QUEUE_DEPTH.name, metrics.QUEUE_DEPTH.documentation,
+                                             registry=metrics.MetricsRegistry())
+    # pool and browser metrics live in this process; publish them like worker.py does
+    shard_id = f"shard-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    snapshot_path = os.path.join(metrics.SNAPSHOT_DIR, f"{shard_id}.json")
+    stopping = threading.Event()
+    threading.Thread(target=_publish_shard_metrics, args=(snapshot_path, stopping),
+                     name="shard-metrics", daemon=True).start()
+    _shard_worker = (loop, orchestrator, snapshot_path, stopping)
+    atexit.register(_close_shard_worker)
+
+
+def _publish_shard_metrics(path: str, stopping: threading.Event):
+    while not stopping.wait(SHARD_SNAPSHOT_INTERVAL):
+        try:
+            metrics.REGISTRY.write_snapshot(path)
+        except OSError:
+            pass
+
+
+def _close_shard_worker():
+    loop, orchestrator, snapshot_path, stopping = _shard_worker
+    try:
+        loop.run_until_complete(orchestrator.pool.close())
+    except Exception:
+        pass  # best effort: the browsers go down with the Playwright driver anyway
+    loop.close()
+    stopping.set()
+    # the last snapshot stays behind: its counters are totals, and its gauges go stale
+    try:
+        metrics.REGISTRY.write_snapshot(snapshot_path)
+    except OSError:
+        pass
+
+
+def _run_shard(shard: list, run_id: str, repeats: int, repeat_budget: Optional[int]) -> tuple:
+    # entry point inside a worker process; repeat_budget is this shard's share of the run-wide budget.
+    # Returns the shard's results and the artifact bytes it wrote, which only this process can count.
+    loop, orchestrator = _shard_worker[:2]
+    orchestrator.repeat_budget = repeat_budget
+    store, writer = get_store(), get_writer()
+    before = store.bytes_written, writer.bytes_written
+    results = loop.run_until_complete(orchestrator._execute_async(shard, run_id, repeats))
+    return results, {"blobs": store.bytes_written - before[0], "artifacts": writer.bytes_written - before[1]}
+
 
 class OrchestratorAgent:
-    async def execute_tests(self, tests: list, run_id: str, repeats: int = 2) -> list:
-        executors = [ExecutorAgent("exec-1"), ExecutorAgent("exec-2")]
-        all_results = []
+    def __init__(self, pool_size: int = 2, max_contexts_per_browser: int = 50, pool: BrowserPool = None,
+                 concurrency: Optional[int] = None, executor_options: Optional[dict] = None,
+                 repeat_mode: str = "fixed", max_repeats: int = 8, repeat_budget: Optional[int] = None,
+                 confidence: float = 0.95, http_cache: Optional[dict] = None,
+                 selector_cache: Optional[dict] = None):
+        if repeat_mode not in REPEAT_MODES:
+            raise ValueError(f"unknown repeat mode {repeat_mode!r}, expected one of {REPEAT_MODES}")
+        self.pool_size = pool_size
+        self.max_contexts_per_browser = max_contexts_per_browser
+        # an externally supplied pool is shared and left open after execute_tests
+        self.pool = pool
+        # max pages in flight; defaults to the pool size
+        self.concurrency = concurrency
+        # forwarded to every ExecutorAgent, e.g. {"settle_mode": "adaptive"}
+        self.executor_options = dict(executor_options or {})
+        # "fixed" runs exactly `repeats` per test; "adaptive" treats `repeats` as the minimum and
+        # adds runs to split tests until repeat_decision() settles them, up to max_repeats per
+        # test and repeat_budget extra runs per execute_tests call (None = no run-wide cap)
+        self.repeat_mode = repeat_mode
+        self.max_repeats = max_repeats
+        self.repeat_budget = repeat_budget
+        self.confidence = confidence
+        # ResponseCache settings (e.g. {"max_bytes": ..., "revalidate": True}); None disables caching.
+        # Kept as plain options so process workers can build their own cache over the same directory.
+        self.http_cache = http_cache
+        self._response_cache = None
+        # SelectorResolver settings (e.g. {"path": ...}); None makes executors wait on raw selectors
+        self.selector_cache = selector_cache
+        self._selector_resolver = None
+        self._semaphore = None
+        self._semaphore_key = None
+        # where queued runs are counted; shard workers swap in a private gauge
+        self.queue_depth = metrics.QUEUE_DEPTH
+        # artifact bytes written by process-mode shard workers, summed as their shards come back
+        self.worker_bytes_written = {"blobs": 0, "artifacts": 0}
+
+    def _worker_options(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "max_contexts_per_browser": self.max_contexts_per_browser,
+            "concurrency": self.concurrency,
+            "executor_options": self.executor_options,
+            "repeat_mode": self.repeat_mode,
+            "max_repeats": self.max_repeats,
+            "repeat_budget": self.repeat_budget,
+            "confidence": self.confidence,
+            "http_cache": self.http_cache,
+            "selector_cache": self.selector_cache
+        }
 
-        for i, test in enumerate(tests):
-            tasks = []
+    async def execute_tests(self, tests: list, run_id: str, repeats: int = 2, mode: str = "async",
+                            processes: Optional[int] = None) -> list:
+        results = [None] * len(tests)
+        async for index, item in self.iter_results(tests, run_id, repeats, mode=mode, processes=processes):
+            results[index] = item
+        return results
+
+    async def iter_results(self, tests: list, run_id: str, repeats: int = 2, mode: str = "async",
+                           processes: Optional[int] = None):
+        """
+        Async generator yielding (index, result) as soon as every repeat of tests[index]
+        has finished, in completion order. `result` has the execute_tests item shape.
+        """
+        if repeats < 1:
+            raise ValueError(f"repeats must be at least 1, got {repeats}")
+        if mode == "process":
+            results = self._iter_sharded(tests, run_id, repeats, processes=processes)
+        elif mode == "async":
+            results = self._iter_async(tests, run_id, repeats)
+        else:
+            raise ValueError(f"unknown execution mode {mode!r}, expected one of {EXECUTION_MODES}")
+
+        # only the parent writes the run manifest, so process workers never race on it;
+        # entries are flushed at most once a second so streamed artifacts resolve early
+        loop = asyncio.get_running_loop()
+        pending = {}
+        last_write = loop.time()
+        try:
+            async for index, item in results:
+                for r in item.get("runs", []):
+                    pending.update(r.get("manifest") or {})
+                if pending and loop.time() - last_write >= 1.0:
+                    get_store().write_manifest(run_id, pending)
+                    pending, last_write = {}, loop.time()
+                yield index, item
+        finally:
+            await results.aclose()
+            if pending:
+                get_store().write_manifest(run_id, pending)
+
+    def _group(self, test: dict, runs: dict, reason: Optional[str]) -> dict:
+        return {
+            "test_id": test.get("id"),
+            "test_case": test,
+            "runs": [runs[r] for r in sorted(runs)],
+            "repeats": {"mode": self.repeat_mode, "runs": len(runs), "stopped": reason}
+        }
+
+    def _stop_reason(self, runs: dict, budget_left: Optional[int]) -> Optional[str]:
+        """None means schedule another repeat; anything else is why this test is done."""
+        if self.repeat_mode == "fixed":
+            return "fixed"
+        passes = sum(1 for r in runs.values() if r.get("ok") and not r.get("error"))
+        settled = repeat_decision(passes, len(runs), self.confidence)
+        if settled:
+            return settled
+        if len(runs) >= self.max_repeats:
+            return "max_repeats"
+        if budget_left is not None and budget_left <= 0:
+            return "budget"
+        return None
+
+    async def _execute_async(self, tests: list, run_id: str, repeats: int = 2) -> list:
+        results = [None] * len(tests)
+        async for index, item in self._iter_async(tests, run_id, repeats):
+            results[index] = item
+        return results
+
+    async def _iter_async(self, tests: list, run_id: str, repeats: int = 2):
+        if not tests:
+            return
+        pool = self.pool or BrowserPool(size=self.pool_size, max_contexts_per_browser=self.max_contexts_per_browser)
+        concurrency = max(1, self.concurrency or pool.size)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_key != (concurrency, loop):
+            # overlapping calls with the same limit share one cap on pages in flight; a call with a
+            # different concurrency (or pool size) starts a fresh one instead of inheriting the old limit
+            self._semaphore = asyncio.Semaphore(concurrency)
+            self._semaphore_key = (concurrency, loop)
+
+        # every (test, repeat) pair goes through one queue; adaptive mode feeds extra repeats back in
+        queue = asyncio.Queue()
+        for i in range(len(tests)):
             for r in range(repeats):
-                ex = executors[(i + r) % len(executors)]
-                tasks.append(ex.run_test(test, run_id))
-            run_results = await asyncio.gather(*tasks)
-            all_results.append({
-                "test_id": test.get("id"),
-                "test_case": test,
-                "runs": run_results
-            })
-        return all_results
+                queue.put_nowait((i, r))
+        self.queue_depth.inc(queue.qsize())
+        runs = [{} for _ in tests]
+        remaining = [repeats] * len(tests)
+        budget = {"left": self.repeat_budget}
+        finished = asyncio.Queue()
+
+        async def worker(ex: ExecutorAgent):
+            while True:
+                work = await queue.get()
+                if work is None:
+                    return
+                self.queue_depth.dec()
+                i, r = work
+                async with self._semaphore:
+                    try:
+                        runs[i][r] = await ex.run_test(tests[i], run_id, repeat=r)
+                    except Exception as e:
+                        # keep the test's group complete so its result is still emitted
+                        runs[i][r] = {"test_id": tests[i].get("id"), "executor": ex.name, "repeat": r,
+                                      "ok": False, "error": f"Executor error: {e!r}", "artifacts": {}}
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    reason = self._stop_reason(runs[i], budget["left"])
+                    if reason is None:
+                        if budget["left"] is not None:
+                            budget["left"] -= 1
+                        remaining[i] += 1
+                        queue.put_nowait((i, len(runs[i])))
+                        self.queue_depth.inc()
+                    else:
+                        finished.put_nowait((i, reason))
+
+        if self.http_cache is not None and self._response_cache is None:
+            self._response_cache = ResponseCache(**self.http_cache)
+        if self.selector_cache is not None and self._selector_resolver is None:
+            self._selector_resolver = SelectorResolver(**self.selector_cache)
+        executors = [
+            ExecutorAgent(f"exec-{n + 1}", pool=pool, http_cache=self._response_cache,
+                          selector_resolver=self._selector_resolver, **self.executor_options)
+            for n in range(min(concurrency, queue.qsize()))
+        ]
+        tasks = []
+        getter = None
+        try:
+            # inside the try, so a pool that fails to start is still closed below
+            await pool.start()
+            tasks = [asyncio.create_task(worker(ex)) for ex in executors]
+            for _ in range(len(tests)):
+                # wait on the workers too: one that dies outside run_test would otherwise leave us waiting forever
+                getter = asyncio.ensure_future(finished.get())
+                done, _ = await asyncio.wait({getter, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    stopped = next(iter(done))
+                    error = stopped.exception() if not stopped.cancelled() else None
+                    raise RuntimeError("executor worker stopped before every test finished") from error
+                i, reason = getter.result()
+                yield i, self._group(tests[i], runs[i], reason)
+            for _ in tasks:
+                queue.put_nowait(None)
+        finally:
+            if getter is not None:
+                getter.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            while not queue.empty():
+                if queue.get_nowait() is not None:
+                    self.queue_depth.dec()
+            if pool is not self.pool:
+                await pool.close()
+            # artifact writes must have landed by the time callers read them
+            await get_writer().flush()
+
+    async def execute_tests_sharded(self, tests: list, run_id: str, repeats: int = 2,
+                                    processes: Optional[int] = None, shard_size: Optional[int] = None) -> list:
+        results = [None] * len(tests)
+        async for index, item in self._iter_sharded(tests, run_id, repeats, processes, shard_size):
+            results[index] = item
+        return results
+
+    async def _iter_sharded(self, tests: list, run_id: str, repeats: int = 2,
+                            processes: Optional[int] = None, shard_size: Optional[int] = None):
+        """
+        Shard `tests` across worker processes, each running its own event loop,
+        BrowserPool and executors, set up once per process and reused by all of
+        the shards it runs. Shards are kept small so results stream back
+        to the parent as each one finishes rather than all at the end.
+        """
+        if not tests:
+            return
+        processes = max(1, min(processes or os.cpu_count() or 1, len(tests)))
+        if shard_size is None:
+            # ~4 shards per process keeps workers busy without tiny round-trips
+            shard_size = max(1, -(-len(tests) // (processes * 4)))
+        shards = [(start, tests[start:start + shard_size]) for start in range(0, len(tests), shard_size)]
+
+        loop = asyncio.get_running_loop()
+        # spawn, not fork: Playwright's driver and the parent's event loop must not be inherited
+        ctx = multiprocessing.get_context("spawn")
+        workers = ProcessPoolExecutor(max_workers=processes, mp_context=ctx,
+                                      initializer=_init_shard_worker, initargs=(self._worker_options(),))
+
+        async def run(start: int, shard: list):
+            share = None
+            if self.repeat_budget is not None:
+                # each shard gets its share of the run-wide extra-repeat budget
+                share = self.repeat_budget * (start + len(shard)) // len(tests) - self.repeat_budget * start // len(tests)
+            return start, await loop.run_in_executor(workers, _run_shard, shard, run_id, repeats, share)
+
+        tasks = [asyncio.ensure_future(run(start, shard)) for start, shard in shards]
+        # queue depth in process mode counts the planned runs of shards that have not come back
+        pending = len(tests) * repeats
+        metrics.QUEUE_DEPTH.inc(pending)
+        try:
+            for done in asyncio.as_completed(tasks):
+                start, (shard_results, written) = await done
+                for sink, count in written.items():
+                    self.worker_bytes_written[sink] += count
+                metrics.QUEUE_DEPTH.dec(len(shard_results) * repeats)
+                pending -= len(shard_results) * repeats
+                for offset, item in enumerate(shard_results):
+                    yield start + offset, item
+        finally:
+            # don't block the event loop waiting on shards nobody will read
+            for task in tasks:
+                task.cancel()
+            metrics.QUEUE_DEPTH.dec(pending)
+            workers.shutdown(wait=False, cancel_futures=True)
@@ -1,53 +1,136 @@
 # agents/planner.py
 import random
 import asyncio
+import hashlib
+import json
 from typing import Optional
 
+TEMPLATES = [
+    "Enter numbers {seq} quickly to reach target {target}.",
+    "Submit sequence {seq} but skip the middle number.",
+    "Try reverse order {seq_rev} and check score.",
+    "Input single large number {big} and observe response.",
+    "Submit repeated digit {repeat} five times."
+]
+
+# give up once this many candidates in a row duplicate earlier step sequences
+MAX_CONSECUTIVE_DUPLICATES = 1000
+# duplicate detection uses ~10 bits per requested candidate (about 1% false positives), capped here
+DEDUP_MAX_BYTES = 16 * 1024 * 1024
+
+
+def step_signature(steps: list) -> bytes:
+    """Compact digest of a step sequence, used to drop exact duplicates."""
+    return hashlib.blake2b(json.dumps(steps, sort_keys=True).encode("utf-8"), digest_size=8).digest()
+
+
+class _SeenFilter:
+    """
+    Bloom filter over step signatures with a size fixed up front, so deduplicating
+    millions of candidates costs at most DEDUP_MAX_BYTES. A false positive only
+    drops a unique candidate, which the generator then replaces with a fresh one.
+    """
+
+    def __init__(self, expected: int, bits_per_item: int = 10, hashes: int = 7,
+                 max_bytes: int = DEDUP_MAX_BYTES):
+        self.nbits = max(1024, min(expected * bits_per_item, max_bytes * 8))
+        self.hashes = hashes
+        self.bits = bytearray((self.nbits + 7) // 8)
+
+    def add(self, signature: bytes) -> bool:
+        """Insert `signature`; True if it was (probably) there already."""
+        h1 = int.from_bytes(signature[:4], "big")
+        h2 = int.from_bytes(signature[4:8], "big") | 1
+        present = True
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % self.nbits
+            mask = 1 << (bit & 7)
+            if not self.bits[bit >> 3] & mask:
+                present = False
+                self.bits[bit >> 3] |= mask
+        return present
+
+
 class PlannerAgent:
     async def generate_tests(self, target_url: str, n: int = 20, seed: Optional[int] = None):
         """
         Generate candidate tests aimed at the provided target_url.
         These are intentionally generic: open page, fill an input if present, click a submit button.
         """
-        if seed is not None:
-            random.seed(seed)
-
-        templates = [
-            "Enter numbers {seq} quickly to reach target {target}.",
-            "Submit sequence {seq} but skip the middle number.",
-            "Try reverse order {seq_rev} and check score.",
-            "Input single large number {big} and observe response.",
-            "Submit repeated digit {repeat} five times."
-        ]
-
         candidates = []
-        for i in range(n):
-            base = random.sample(range(1, 50), k=4)
-            seq = "-".join(map(str, base))
-            seq_rev = "-".join(map(str, reversed(base)))
-
-            # Use conservative selectors (these are fallback selectors).
-            steps = [
-                {"action": "load", "url": target_url},
-                # Try a generic input - update later if you find the real selector
-                {"action": "fill", "selector": "input[type='text'], input[id*='input'], textarea, #input", "value": seq},
-                # Try a generic submit/click - update to actual selector if needed
-                {"action": "click", "selector": "button[type='submit'], button[id*='submit'], #submit"}
-            ]
-
-            candidate = {
-                "id": f"t{i+1}",
-                "description": random.choice(templates).format(
-                    seq=seq,
-                    seq_rev=seq_rev,
-                    target=random.randint(10, 200),
-                    big=random.randint(1000, 9999),
-                    repeat=random.choice([1, 2, 3, 4, 5])
-                ),
-                "steps": steps,
-                "estimated_cost": round(random.uniform(0.1, 2.0), 3)
-            }
-            candidates.append(candidate)
-            await asyncio.sleep(0)  # yield control for async
-
+        async for batch in self.iter_candidates(target_url, n, seed=seed):
+            candidates.extend(batch)
         return candidates
+
+    async def iter_candidates(self, target_url: str, n: int = 20, seed: Optional[int] = None,
+                              batch_size: int = 1000):
+        """
+        Yield candidates in batches of up to `batch_size`. Each call uses its own
+        random.Random(seed), so concurrent requests never disturb each other and a
+        given seed always yields the same candidates. Candidates whose steps exactly
+        repeat an earlier one are dropped. The check uses a fixed-size filter (see
+        _SeenFilter), so memory does not grow with the number of candidates.
+        """
+        rng = random.Random(seed)
+        seen = _SeenFilter(n)
+        batch = []
+        produced = 0
+        duplicates = 0
+        while produced < n and duplicates < MAX_CONSECUTIVE_DUPLICATES:
+            candidate = self._make_candidate(rng, target_url, produced + 1)
+            signature = step_signature(candidate["steps"])
+            if seen.add(signature):
+                duplicates += 1
+                continue
+            duplicates = 0
+            produced += 1
+            batch.append(candidate)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                await asyncio.sleep(0)  # yield control for async
+        if batch:
+            yield batch
+
+    async def write_candidates(self, path: str, target_url: str, n: int = 20, seed: Optional[int] = None,
+                               header: Optional[dict] = None, batch_size: int = 1000) -> int:
+        """
+        Stream candidates to an append-only JSONL file, one batch at a time, and return
+        how many were written. An optional `header` is written first as {"_meta": header}.
+        """
+        count = 0
+        with open(path, "a", encoding="utf-8") as f:
+            if header is not None:
+                f.write(json.dumps({"_meta": header}) + "\n")
+            async for batch in self.iter_candidates(target_url, n, seed=seed, batch_size=batch_size):
+                await asyncio.to_thread(f.write, "".join(json.dumps(c) + "\n" for c in batch))
+                count += len(batch)
+        return count
+
+    @staticmethod
+    def _make_candidate(rng: random.Random, target_url: str, number: int) -> dict:
+        base = rng.sample(range(1, 50), k=4)
+        seq = "-".join(map(str, base))
+        seq_rev = "-".join(map(str, reversed(base)))
+
+        # Use conservative selectors (these are fallback selectors).
+        steps = [
+            {"action": "load", "url": target_url},
+            # Try a generic input - update later if you find the real selector
+            {"action": "fill", "selector": "input[type='text'], input[id*='input'], textarea, #input", "value": seq},
+            # Try a generic submit/click - update to actual selector if needed
+            {"action": "click", "selector": "button[type='submit'], button[id*='submit'], #submit"}
+        ]
+
+        return {
+            "id": f"t{number}",
+            "description": rng.choice(TEMPLATES).format(
+                seq=seq,
+                seq_rev=seq_rev,
+                target=rng.randint(10, 200),
+                big=rng.randint(1000, 9999),
+                repeat=rng.choice([1, 2, 3, 4, 5])
+            ),
+            "steps": steps,
+            "estimated_cost": round(rng.uniform(0.1, 2.0), 3)
+        }
@@ -1,21 +1,128 @@
 import os
-from langchain.embeddings import OpenAIEmbeddings
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional
 from langchain.vectorstores import Chroma
 from langchain.chat_models import ChatOpenAI
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from agents.embeddings import get_embeddings, index_version
 
 PERSIST_DIR = os.environ.get("RAG_PERSIST_DIR", "knowledge_store")
+RAG_CACHE_SIZE = int(os.environ.get("RAG_CACHE_SIZE", "1024"))
 
-def get_retriever(k=4, persist_dir=PERSIST_DIR):
-    embeddings = OpenAIEmbeddings()
-    vectordb = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
-    return vectordb.as_retriever(search_kwargs={"k": k})
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RetrieverService:
+    """
+    Long-lived handle on the persisted index: the embeddings client and Chroma store are
+    opened once, and query embeddings and top-k results are kept in LRU caches. Every
+    lookup compares the index version file (one stat) and reopens the store and clears
+    the caches when ingestion has written since.
+    """
+
+    def __init__(self, persist_dir=PERSIST_DIR, cache_size: int = RAG_CACHE_SIZE):
+        self.persist_dir = persist_dir
+        self.query_cache = _LRU(cache_size)
+        self.result_cache = _LRU(cache_size)
+        self._lock = threading.Lock()
+        self._version = None
+        self._embeddings = None
+        self._vectordb = None
+        self._qa = {}
+
+    def _refresh(self):
+        version = index_version(self.persist_dir)
+        if version == self._version and self._vectordb is not None:
+            return
+        with self._lock:
+            if version == self._version and self._vectordb is not None:
+                return
+            # same backend the index was built with (recorded by scripts/ingest_knowledge.py)
+            self._embeddings = get_embeddings(self.persist_dir)
+            self._vectordb = Chroma(persist_directory=self.persist_dir, embedding_function=self._embeddings)
+            self.query_cache.clear()
+            self.result_cache.clear()
+            self._version = version
+
+    def embed_query(self, query: str) -> List[float]:
+        self._refresh()
+        vector = self.query_cache.get(query)
+        if vector is None:
+            vector = self._embeddings.embed_query(query)
+            self.query_cache.put(query, vector)
+        return vector
+
+    def search(self, query: str, k: int = 4, filter: Optional[dict] = None) -> List[Document]:
+        """Top-k documents for `query`; `filter` is a Chroma metadata filter, e.g. {"verdict": "fail"}."""
+        self._refresh()
+        key = (query, k, json.dumps(filter, sort_keys=True) if filter else None)
+        docs = self.result_cache.get(key)
+        if docs is None:
+            docs = self._vectordb.similarity_search_by_vector(self.embed_query(query), k=k, filter=filter)
+            self.result_cache.put(key, docs)
+        return list(docs)
+
+    def as_retriever(self, k: int = 4, filter: Optional[dict] = None) -> BaseRetriever:
+        return CachedRetriever(service=self, k=k, filter=filter)
+
+    def retrieval_qa(self, model_name="gpt-3.5-turbo", temperature=0.0):
+        key = (model_name, temperature)
+        if key not in self._qa:
+            llm = ChatOpenAI(model=model_name, temperature=temperature)
+            self._qa[key] = RetrievalQA.from_chain_type(llm=llm, retriever=self.as_retriever(), chain_type="stuff")
+        return self._qa[key]
+
+
+class CachedRetriever(BaseRetriever):
+    service: Any
+    k: int = 4
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        return self.service.search(query, self.k, self.filter)
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_service(persist_dir=PERSIST_DIR) -> RetrieverService:
+    """Process-wide RetrieverService for `persist_dir`."""
+    with _services_lock:
+        if persist_dir not in _services:
+            _services[persist_dir] = RetrieverService(persist_dir)
+        return _services[persist_dir]
+
+def get_retriever(k=4, persist_dir=PERSIST_DIR, filter=None):
+    return get_service(persist_dir).as_retriever(k, filter)
 
 def get_retrieval_qa(model_name="gpt-3.5-turbo", temperature=0.0, persist_dir=PERSIST_DIR):
-    llm = ChatOpenAI(model=model_name, temperature=temperature)
-    retriever = get_retriever(persist_dir=persist_dir)
-    qa = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type="stuff")
-    return qa
+    return get_service(persist_dir).retrieval_qa(model_name, temperature)
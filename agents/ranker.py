@@ -1,17 +1,180 @@
+import re
+from itertools import islice
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+DEFAULT_WEIGHTS = {"cost": 1.0, "failure_rate": -0.5, "steps": 0.0}
+CHUNK_SIZE = 65536
+SELECTION_MODES = ("score", "diverse")
+
+
+def _value_features(value) -> tuple:
+    """Coarse features of a fill value: token count, order, repeated tokens, magnitude bucket."""
+    tokens = [t for t in re.split(r"[^0-9A-Za-z]+", str(value)) if t]
+    if not tokens:
+        return (("tokens", 0),)
+    numbers = [int(t) for t in tokens if t.isdigit()]
+    if len(numbers) < len(tokens):
+        order = "text"
+    elif len(numbers) == 1:
+        order = "single"
+    elif all(a < b for a, b in zip(numbers, numbers[1:])):
+        order = "ascending"
+    elif all(a > b for a, b in zip(numbers, numbers[1:])):
+        order = "descending"
+    else:
+        order = "mixed"
+    magnitude = len(str(max(numbers))) if numbers else 0
+    return (
+        ("tokens", min(len(tokens), 5)),
+        ("order", order),
+        ("repeats", len(set(tokens)) < len(tokens)),
+        ("magnitude", min(magnitude, 4))
+    )
+
+
+def coverage_units(candidate: dict) -> frozenset:
+    """
+    Behaviours a candidate exercises: its step structure (action + selector per step)
+    plus the value features of each fill. Candidates with the same units form one
+    equivalence class and are treated as interchangeable by diverse selection.
+    """
+    steps = candidate.get("steps") or ()
+    units = {("structure", tuple((s.get("action"), s.get("selector")) for s in steps))}
+    for i, step in enumerate(steps):
+        if "value" in step:
+            units.update((f"step{i}",) + feature for feature in _value_features(step["value"]))
+    return frozenset(units)
+
+
 class RankerAgent:
     """
-    Simple scoring system:
-    - Uses estimated_cost as the main score
+    Vectorized scoring system:
+    - score = w_cost * estimated_cost + w_failure_rate * historical failure rate + w_steps * step count
     - Adds a small bias from the test_id (so it's deterministic)
-    - Lower score = better
+    - Lower score = better; a negative failure_rate weight favours tests that have failed before
+    Candidates are scored in NumPy one chunk at a time and only the best top_k of each
+    chunk are kept (np.argpartition), so memory stays O(chunk_size + top_k) whatever
+    the pool size, and no full sort is ever done.
+    With mode="diverse", candidates are grouped into equivalence classes by
+    coverage_units() and the selection greedily maximizes newly covered units per
+    unit of estimated_cost, one representative (the best-scored) per class; any
+    remaining slots are filled by score.
     """
 
-    def rank_and_select(self, candidates, top_k: int = 10):
-        scored = []
-        for c in candidates:
-            score = c.get("estimated_cost", 1.0)
-            bias = (sum(ord(ch) for ch in c["id"]) % 10) / 100.0
-            scored.append((score + bias, c))
-        scored.sort(key=lambda x: x[0])
-        selected = [c for _, c in scored[:top_k]]
-        return selected
+    def __init__(self, weights: Optional[dict] = None, chunk_size: int = CHUNK_SIZE):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.chunk_size = chunk_size
+
+    def rank_and_select(self, candidates: Iterable[dict], top_k: int = 10,
+                        failure_rate: Optional[Callable[[dict], float]] = None, mode: str = "score") -> list:
+        return [c for _, _, c in self.rank_with_scores(candidates, top_k, failure_rate, mode)]
+
+    def rank_with_scores(self, candidates: Iterable[dict], top_k: int = 10,
+                         failure_rate: Optional[Callable[[dict], float]] = None, mode: str = "score") -> list:
+        """
+        Returns [(position, score, candidate)] for the selected top_k; `position` is the
+        candidate's index in the input. In "score" mode they are best first and ties keep
+        input order, like a stable sort; in "diverse" mode they are in greedy pick order.
+        `failure_rate(candidate)` supplies the historical failure rate feature (0.0 when omitted).
+        """
+        if mode not in SELECTION_MODES:
+            raise ValueError(f"unknown selection mode {mode!r}, expected one of {SELECTION_MODES}")
+        if top_k <= 0:
+            return []
+        # diverse mode: best-scored (score, position, candidate) per coverage class
+        classes = {} if mode == "diverse" else None
+        best_pos = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float64)
+        best = []
+        it = iter(candidates)
+        offset = 0
+        while True:
+            chunk = list(islice(it, self.chunk_size))
+            if not chunk:
+                break
+            scores = self._score(chunk, failure_rate)
+            positions = np.arange(offset, offset + len(chunk), dtype=np.int64)
+            if classes is not None:
+                for position, score, candidate in zip(positions.tolist(), scores.tolist(), chunk):
+                    key = coverage_units(candidate)
+                    if key not in classes or score < classes[key][0]:
+                        classes[key] = (score, position, candidate)
+            offset += len(chunk)
+
+            all_scores = np.concatenate([best_scores, scores])
+            all_pos = np.concatenate([best_pos, positions])
+            keep = self._smallest(all_scores, all_pos, top_k)
+            pool = best + chunk
+            best = [pool[i] for i in keep]
+            best_scores = all_scores[keep]
+            best_pos = all_pos[keep]
+
+        ranked = [(int(p), float(s), c) for p, s, c in zip(best_pos, best_scores, best)]
+        if classes is None:
+            return ranked
+        return self._diversify(classes, ranked, top_k)
+
+    @staticmethod
+    def _diversify(classes: dict, ranked: list, top_k: int) -> list:
+        """Greedy weighted max-coverage over class representatives, topped up from the score ranking."""
+        remaining = dict(classes)
+        covered = set()
+        picked = []
+        while remaining and len(picked) < top_k:
+            best_key, best_gain = None, 0.0
+            for units, (score, position, candidate) in remaining.items():
+                new = len(units - covered)
+                if not new:
+                    continue
+                gain = new / max(candidate.get("estimated_cost", 1.0), 1e-3)
+                # ties go to the better score, then to input order
+                if best_key is None or gain > best_gain or (
+                        gain == best_gain and (score, position) < remaining[best_key][:2]):
+                    best_key, best_gain = units, gain
+            if best_key is None:
+                break
+            score, position, candidate = remaining.pop(best_key)
+            covered |= best_key
+            picked.append((position, score, candidate))
+
+        taken = {position for position, _, _ in picked}
+        for position, score, candidate in ranked:
+            if len(picked) >= top_k:
+                break
+            if position not in taken:
+                picked.append((position, score, candidate))
+                taken.add(position)
+        return picked
+
+    def _score(self, chunk: list, failure_rate) -> np.ndarray:
+        n = len(chunk)
+        w = self.weights
+        cost = np.fromiter((c.get("estimated_cost", 1.0) for c in chunk), dtype=np.float64, count=n)
+        scores = w["cost"] * cost
+        if w["steps"]:
+            steps = np.fromiter((len(c.get("steps") or ()) for c in chunk), dtype=np.float64, count=n)
+            scores += w["steps"] * steps
+        if w["failure_rate"] and failure_rate is not None:
+            rates = np.fromiter((failure_rate(c) or 0.0 for c in chunk), dtype=np.float64, count=n)
+            scores += w["failure_rate"] * rates
+        return scores + self._id_bias([c["id"] for c in chunk])
+
+    @staticmethod
+    def _id_bias(ids: list) -> np.ndarray:
+        # (sum of code points of id) % 10 / 100, computed on a fixed-width UCS-4 view
+        arr = np.asarray(ids, dtype=np.str_)
+        codes = arr.view(np.uint32).reshape(len(ids), -1)
+        return (codes.sum(axis=1, dtype=np.int64) % 10) / 100.0
+
+    @staticmethod
+    def _smallest(scores: np.ndarray, positions: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k lowest scores, ordered by (score, position)."""
+        if len(scores) > k:
+            kth = np.partition(scores, k - 1)[k - 1]
+            candidates = np.flatnonzero(scores <= kth)
+        else:
+            candidates = np.arange(len(scores))
+        order = np.lexsort((positions[candidates], scores[candidates]))[:k]
+        return candidates[order]
@@ -0,0 +1,128 @@
+# agents/registry.py
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+REGISTRY_PATH = os.path.join("reports", "registry.sqlite3")
+
+RUN_STATES = ("planned", "ranked", "queued", "running", "complete", "error")
+
+_COLUMNS = (
+    "run_id", "label", "target_url", "state", "created_at", "updated_at",
+    "candidates_path", "ranked_path", "report_path", "events_path"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    label TEXT,
+    target_url TEXT,
+    state TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    candidates_path TEXT,
+    ranked_path TEXT,
+    report_path TEXT,
+    events_path TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_state_created ON runs (state, created_at);
+CREATE INDEX IF NOT EXISTS runs_target_created ON runs (target_url, created_at);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at);
+"""
+
+# legacy file names written before the registry existed
+_LEGACY_FILE = re.compile(
+    r"(?P<run_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})_(?P<kind>candidates|ranked|report)\.jsonl?$"
+)
+
+
+class RunRegistry:
+    """
+    SQLite index of runs keyed by run_id: state, target URL, timestamps and the
+    paths of the candidates / ranked / report / events files. Replaces scanning
+    the runs directory on every request.
+    """
+
+    def __init__(self, db_path: str = REGISTRY_PATH):
+        self.db_path = db_path
+        self.created = not os.path.exists(db_path)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        # WAL lets API workers read while another process writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def register(self, run_id: str, target_url: str, candidates_path: str, label: Optional[str] = None,
+                 created_at: Optional[str] = None):
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, label, target_url, state, created_at, updated_at, candidates_path) "
+                "VALUES (?, ?, ?, 'planned', ?, ?, ?)",
+                (run_id, label, target_url, created_at or now, now, candidates_path)
+            )
+
+    def update(self, run_id: str, **fields) -> bool:
+        unknown = set(fields) - set(_COLUMNS[1:])
+        if unknown:
+            raise ValueError(f"unknown registry fields: {sorted(unknown)}")
+        if "state" in fields and fields["state"] not in RUN_STATES:
+            raise ValueError(f"unknown run state {fields['state']!r}, expected one of {RUN_STATES}")
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                f"UPDATE runs SET {assignments} WHERE run_id = ?", (*fields.values(), run_id)
+            )
+        return cur.rowcount > 0
+
+    def get(self, run_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_runs(self, state: Optional[str] = None, target_url: Optional[str] = None,
+                  limit: int = 50, offset: int = 0) -> list:
+        clauses, params = [], []
+        if state:
+            clauses.append("state = ?")
+            params.append(state)
+        if target_url:
+            clauses.append("target_url = ?")
+            params.append(target_url)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM runs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count_by_state(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM runs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def backfill(self, runs_dir: str) -> int:
+        """One-off import of runs written before the registry existed; returns how many were added."""
+        found = {}
+        for name in os.listdir(runs_dir):
+            m = _LEGACY_FILE.search(name)
+            if m:
+                found.setdefault(m.group("run_id"), {})[m.group("kind")] = os.path.join(runs_dir, name)
+        added = 0
+        for run_id, files in found.items():
+            if self.get(run_id) is not None:
+                continue
+            state = "complete" if "report" in files else "ranked" if "ranked" in files else "planned"
+            created = datetime.utcfromtimestamp(os.path.getmtime(next(iter(files.values())))).isoformat()
+            self.register(run_id, None, files.get("candidates"), created_at=created)
+            self.update(run_id, state=state, ranked_path=files.get("ranked"), report_path=files.get("report"))
+            added += 1
+        return added
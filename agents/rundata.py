@@ -0,0 +1,104 @@
+# agents/rundata.py
+import json
+import os
+from array import array
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Candidates are stored one JSON object per line behind a {"_meta": {...}} header line.
+# A ranked file only holds references into that file: {"id", "score", "position", "offset"},
+# where `offset` is the byte offset of the candidate's line, so the selected subset can be
+# read back with a seek per test instead of parsing every candidate again.
+# Runs written before this format (indented JSON with a "candidates" list, ranked files
+# with full candidate objects under "top_k") are still read.
+
+
+def is_jsonl(path: str) -> bool:
+    return path.endswith(".jsonl")
+
+
+def read_meta(path: str) -> dict:
+    """Run metadata of a candidates file, without the candidates themselves."""
+    if is_jsonl(path):
+        with open(path, "rb") as f:
+            first = f.readline()
+        return json.loads(first).get("_meta", {}) if first else {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.pop("candidates", None)
+    return data
+
+
+def iter_with_offsets(path: str) -> Iterator[Tuple[Optional[int], dict]]:
+    """Yield (byte offset, candidate) in file order; offsets are None for legacy JSON files."""
+    if not is_jsonl(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for candidate in json.load(f).get("candidates", []):
+                yield None, candidate
+        return
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "_meta" in record:
+                continue
+            yield start, record
+
+
+def rank_file(ranker, path: str, top_k: int = 10, mode: str = "score", failure_rate=None) -> list:
+    """Rank a candidates file in one streaming pass and return references to the selection."""
+    offsets = array("q")
+
+    def candidates():
+        for offset, candidate in iter_with_offsets(path):
+            offsets.append(-1 if offset is None else offset)
+            yield candidate
+
+    selected = ranker.rank_with_scores(candidates(), top_k, failure_rate, mode)
+    return [
+        {
+            "id": candidate.get("id"),
+            "score": round(score, 6),
+            "position": position,
+            "offset": offsets[position] if offsets[position] >= 0 else None
+        }
+        for position, score, candidate in selected
+    ]
+
+
+def write_ranked(path: str, meta: dict, candidates_path: str, refs: list, mode: str = "score"):
+    payload = {**meta, "candidates_path": candidates_path, "selection_mode": mode, "top_k": refs}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def read_candidates(path: str, refs: Iterable[dict]) -> list:
+    """Load the referenced candidates, in reference order, seeking straight to each line."""
+    refs = list(refs)
+    if not is_jsonl(path):
+        with open(path, "r", encoding="utf-8") as f:
+            candidates = json.load(f).get("candidates", [])
+        return [candidates[ref["position"]] for ref in refs]
+    out = []
+    with open(path, "rb") as f:
+        for ref in refs:
+            f.seek(ref["offset"])
+            candidate = json.loads(f.readline())
+            if candidate.get("id") != ref.get("id"):
+                raise ValueError(f"{path} changed since ranking: expected {ref.get('id')!r} at offset {ref['offset']}")
+            out.append(candidate)
+    return out
+
+
+def load_ranked(path: str) -> Tuple[dict, list]:
+    """(run metadata, selected candidates) from a ranked file, resolving references if needed."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    refs = data.pop("top_k", [])
+    if refs and "steps" not in refs[0]:
+        return data, read_candidates(data["candidates_path"], refs)
+    return data, refs
@@ -0,0 +1,151 @@
+# agents/runner.py
+import asyncio
+import json
+import os
+from typing import Optional
+
+from . import metrics
+from . import rundata
+from .analyzer import AnalyzerAgent
+from .history import TestHistory
+from .orchestrator import OrchestratorAgent
+from .registry import RunRegistry
+
+RUNS_DIR = "reports/runs"
+
+# execution settings, read by the worker processes that run jobs (see worker.py)
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+MAX_CONTEXTS_PER_BROWSER = int(os.environ.get("MAX_CONTEXTS_PER_BROWSER", "50"))
+EXECUTOR_CONCURRENCY = int(os.environ.get("EXECUTOR_CONCURRENCY", str(BROWSER_POOL_SIZE)))
+# "fixed" keeps the 0.25 s delay after every step; "adaptive" waits for network/DOM quiet
+SETTLE_MODE = os.environ.get("SETTLE_MODE", "fixed")
+SETTLE_QUIET_MS = int(os.environ.get("SETTLE_QUIET_MS", "150"))
+# always | on-failure | first-repeat | sampled (failing runs are always captured)
+CAPTURE_POLICY = os.environ.get("CAPTURE_POLICY", "always")
+CAPTURE_SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", "0.1"))
+# console capture: debug | log | warning | error minimum level, per-type messages/second (0 = unlimited),
+# and how many trailing lines each run result keeps for triage
+CONSOLE_LEVEL = os.environ.get("CONSOLE_LEVEL", "debug")
+CONSOLE_RATE_LIMIT = float(os.environ.get("CONSOLE_RATE_LIMIT", "100")) or None
+CONSOLE_TAIL = int(os.environ.get("CONSOLE_TAIL", "20"))
+# "fixed" always runs REPEATS per test; "adaptive" starts at REPEATS and adds runs only to split tests
+REPEATS = int(os.environ.get("REPEATS", "2"))
+REPEAT_MODE = os.environ.get("REPEAT_MODE", "fixed")
+MAX_REPEATS = int(os.environ.get("MAX_REPEATS", "8"))
+REPEAT_BUDGET = int(os.environ["REPEAT_BUDGET"]) if os.environ.get("REPEAT_BUDGET") else None
+# disk cache for the game's static assets, shared by every browser context and worker; entries are reused
+# while fresh under Cache-Control/Expires and revalidated after that (HTTP_CACHE_REVALIDATE=1: always)
+HTTP_CACHE = os.environ.get("HTTP_CACHE", "1") == "1"
+HTTP_CACHE_MAX_MB = int(os.environ.get("HTTP_CACHE_MAX_MB", "512"))
+HTTP_CACHE_REVALIDATE = os.environ.get("HTTP_CACHE_REVALIDATE", "0") == "1"
+# remember which fallback selector matches per page version instead of waiting on misses every run
+SELECTOR_CACHE = os.environ.get("SELECTOR_CACHE", "1") == "1"
+
+
+def events_path(run_id: str) -> str:
+    return os.path.join(RUNS_DIR, f"{run_id}_events.jsonl")
+
+
+def append_event(run_id: str, event: dict):
+    with open(events_path(run_id), "a", encoding="utf-8") as f:
+        f.write(json.dumps(event) + "\n")
+
+
+def report_path(run_id: str) -> str:
+    return os.path.join(RUNS_DIR, f"{run_id}_report.json")
+
+
+def write_report(run_id: str, report: dict):
+    # write-then-rename so /report never serves a half-written file
+    out_path = report_path(run_id)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, out_path)
+
+
+def _load_partial_report(run_id: str, job_id: str) -> Optional[dict]:
+    """The report snapshot an interrupted attempt at `job_id` left behind, if it can be resumed."""
+    try:
+        with open(report_path(run_id), "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return report if report.get("job_id") == job_id and report.get("status") in ("running", "error") else None
+
+
+def build_orchestrator(repeat_mode: str = REPEAT_MODE) -> OrchestratorAgent:
+    return OrchestratorAgent(
+        pool_size=BROWSER_POOL_SIZE,
+        max_contexts_per_browser=MAX_CONTEXTS_PER_BROWSER,
+        concurrency=EXECUTOR_CONCURRENCY,
+        executor_options={
+            "settle_mode": SETTLE_MODE,
+            "settle_quiet_ms": SETTLE_QUIET_MS,
+            "capture_policy": CAPTURE_POLICY,
+            "sample_rate": CAPTURE_SAMPLE_RATE,
+            "console_level": CONSOLE_LEVEL,
+            "console_rate_limit": CONSOLE_RATE_LIMIT,
+            "console_tail": CONSOLE_TAIL
+        },
+        repeat_mode=repeat_mode,
+        max_repeats=MAX_REPEATS,
+        repeat_budget=REPEAT_BUDGET,
+        http_cache={"max_bytes": HTTP_CACHE_MAX_MB * 1024 * 1024, "revalidate": HTTP_CACHE_REVALIDATE} if HTTP_CACHE else None,
+        selector_cache={} if SELECTOR_CACHE else None
+    )
+
+
+async def execute_run(run_id: str, ranked_path: str, registry: RunRegistry, history: Optional[TestHistory] = None,
+                      mode: str = "async", processes: Optional[int] = None, repeat_mode: str = REPEAT_MODE,
+                      job_id: Optional[str] = None):
+    """
+    Execute a ranked run, folding results into the report and event log as they land.
+    With a `job_id`, tests already in the report snapshot of an interrupted earlier
+    attempt at the same job are kept and only the rest are executed. Errors are
+    recorded in the report and re-raised; the caller decides between retrying and
+    failing the run.
+    """
+    data, top_k = await asyncio.to_thread(rundata.load_ranked, ranked_path)
+    orchestrator = build_orchestrator(repeat_mode)
+    analyzer = AnalyzerAgent(history=history)
+
+    report = _load_partial_report(run_id, job_id) if job_id else None
+    if report is not None:
+        done = {entry.get("test_id") for entry in report["summary"]}
+        pending = [t for t in top_k if t.get("id") not in done]
+        report["status"] = "running"
+        report.pop("error", None)
+        append_event(run_id, {"event": "resumed", "run_id": run_id, "completed": len(done), "remaining": len(pending)})
+    else:
+        report = analyzer.start_report(run_id, data)
+        report["job_id"] = job_id
+        pending = top_k
+        append_event(run_id, {"event": "started", "run_id": run_id, "total": len(top_k)})
+    write_report(run_id, report)
+    registry.update(run_id, state="running", report_path=report_path(run_id))
+
+    # the snapshot on disk is refreshed at most once a second; it is also what a retry resumes from
+    loop = asyncio.get_running_loop()
+    last_write = loop.time()
+    metrics.EXECUTIONS_IN_PROGRESS.inc()
+    try:
+        async for _, item in orchestrator.iter_results(pending, run_id, REPEATS, mode=mode, processes=processes):
+            entry = analyzer.add_result(report, item)
+            metrics.observe_result(item, entry["verdict"])
+            append_event(run_id, {"event": "result", **entry})
+            if loop.time() - last_write >= 1.0:
+                write_report(run_id, report)
+                last_write = loop.time()
+    except BaseException as e:
+        report["status"] = "error"
+        report["error"] = repr(e)
+        write_report(run_id, report)
+        raise
+    finally:
+        metrics.EXECUTIONS_IN_PROGRESS.dec()
+
+    analyzer.finish_report(report, order=[t.get("id") for t in top_k])
+    write_report(run_id, report)
+    append_event(run_id, {"event": "done", "stats": report["stats"]})
+    registry.update(run_id, state="complete")
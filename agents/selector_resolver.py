@@ -0,0 +1,172 @@
+# agents/selector_resolver.py
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .artifacts import get_writer
+
+CACHE_PATH = Path("reports") / "selector_cache.json"
+# seconds a "nothing matches" result is trusted (in this process only) before the full wait is retried
+MISS_TTL = 60.0
+
+# One round-trip: a fingerprint of the page build plus which candidate selectors match right now.
+_PROBE_JS = """
+(candidates) => {
+    // asset URLs plus their decoded sizes, so a new bundle shipped under the same URL
+    // still changes the version (sizes are 0 for cross-origin assets without Timing-Allow-Origin)
+    const size = url => {
+        const entry = url && performance.getEntriesByName(url)[0];
+        return entry ? entry.decodedBodySize : "";
+    };
+    const assets = [
+        ...Array.from(document.scripts, s => s.src),
+        ...Array.from(document.querySelectorAll("link[rel='stylesheet']"), l => l.href)
+    ].map(url => `${url}#${size(url)}`);
+    const fingerprint = [location.origin + location.pathname, document.title, ...assets].join("|");
+    const matches = candidates.map(c => {
+        try { return document.querySelector(c) !== null; } catch (e) { return false; }
+    });
+    return {fingerprint, matches};
+}
+"""
+
+
+def split_selector_list(selector: str) -> list:
+    """Split a comma-joined selector list on top-level commas only (not inside (), [] or quotes)."""
+    parts, depth, quote, current = [], 0, None, []
+    for ch in selector:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth = max(0, depth - 1)
+        elif ch == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(ch)
+    parts.append("".join(current).strip())
+    return [p for p in parts if p]
+
+
+class SelectorResolver:
+    """
+    Resolves the planner's comma-joined fallback selectors to the one concrete
+    selector that matches on a given page version, and remembers the answer
+    per (url, page version, selector list). Matches persist to `path` and are
+    shared by every executor and worker process; "nothing matches" is only kept
+    in memory for `miss_ttl` seconds, and during that time lookups still re-probe
+    the page once (without waiting) before giving up.
+    The page version is a hash of the URL, title and script/stylesheet URLs and
+    sizes, so a new deploy of the game is probed afresh. New matches are written
+    to disk on the artifact writer thread, several at a time; `flush()` of that
+    writer (done at the end of every orchestrator call) makes them durable.
+    """
+
+    def __init__(self, path=CACHE_PATH, persist: bool = True, miss_ttl: float = MISS_TTL):
+        self.path = Path(path)
+        self.persist = persist
+        self.miss_ttl = miss_ttl
+        self.probes = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_queued = False
+        self._cache = self._load()
+        # key -> monotonic time of the last timed-out lookup
+        self._misses = {}
+
+    def _load(self) -> dict:
+        if not self.persist or not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # older cache files also persisted misses; those are not trusted across runs
+        return {k: v for k, v in entries.items() if v.get("selector") is not None}
+
+    def _schedule_save(self):
+        # one queued save covers every match resolved before it runs
+        with self._lock:
+            if not self.persist or self._save_queued:
+                return
+            self._save_queued = True
+        get_writer().submit(self._save)
+
+    def _save(self):
+        """Runs on the artifact writer thread, never on the event loop."""
+        with self._save_lock:
+            with self._lock:
+                self._save_queued = False
+                entries = dict(self._cache)
+            # merge with whatever other processes have written since we loaded
+            merged = self._load()
+            merged.update(entries)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(merged, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+            with self._lock:
+                for key, entry in merged.items():
+                    self._cache.setdefault(key, entry)
+
+    @staticmethod
+    def _key(version: str, selector: str) -> str:
+        return f"{version}|{selector}"
+
+    async def page_version(self, page) -> str:
+        probe = await page.evaluate(_PROBE_JS, [])
+        return hashlib.sha1(probe["fingerprint"].encode("utf-8")).hexdigest()[:16]
+
+    async def resolve(self, page, selector: str, version: str, wait_timeout: int = 3000) -> Optional[str]:
+        """
+        Concrete selector that matches on this page version, or None if none does.
+        A lookup waits up to `wait_timeout` ms for late-rendered elements unless the same key
+        already timed out within the last `miss_ttl` seconds.
+        """
+        key = self._key(version, selector)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry["selector"]
+
+        candidates = split_selector_list(selector)
+        self.probes += 1
+        resolved = await self._probe(page, candidates)
+        missed_at = self._misses.get(key)
+        if resolved is None and missed_at is not None and time.monotonic() - missed_at < self.miss_ttl:
+            # a recent lookup already waited the full timeout; don't wait again yet
+            return None
+        if resolved is None:
+            try:
+                await page.wait_for_selector(selector, timeout=wait_timeout)
+                resolved = await self._probe(page, candidates)
+            except Exception:
+                resolved = None
+        if resolved is None:
+            self._misses[key] = time.monotonic()
+            return None
+        self._misses.pop(key, None)
+        with self._lock:
+            self._cache[key] = {"selector": resolved, "url": page.url, "candidates": candidates}
+        self._schedule_save()
+        return resolved
+
+    @staticmethod
+    async def _probe(page, candidates: list) -> Optional[str]:
+        probe = await page.evaluate(_PROBE_JS, candidates)
+        for candidate, matched in zip(candidates, probe["matches"]):
+            if matched:
+                return candidate
+        return None
@@ -0,0 +1,170 @@
+# benchmarks/game_server.py
+"""
+Local stand-in for the game under test: a static page with the text input and submit
+button the planner's fallback selectors target, plus configurable static asset weight
+and artificial per-request latency, so executor benchmarks run without network noise.
+
+    python benchmarks/game_server.py --port 8765 --assets 8 --asset-kb 256 --latency-ms 40
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>SumLink (benchmark stand-in)</title>
+{styles}
+{scripts}
+</head>
+<body>
+<h1>SumLink</h1>
+<form id="game" onsubmit="return false;">
+  <input type="text" id="input" name="sequence" autocomplete="off">
+  <button type="submit" id="submit">Submit</button>
+</form>
+<div id="score">0</div>
+<ul id="history"></ul>
+<script>
+document.getElementById("submit").addEventListener("click", async () => {{
+  const value = document.getElementById("input").value;
+  const numbers = value.split(/[^0-9]+/).filter(Boolean).map(Number);
+  console.log("submitted", value);
+  const resp = await fetch("/api/score", {{method: "POST", body: JSON.stringify({{numbers}})}});
+  const data = await resp.json();
+  document.getElementById("score").textContent = data.score;
+  const li = document.createElement("li");
+  li.textContent = value + " -> " + data.score;
+  document.getElementById("history").appendChild(li);
+}});
+</script>
+</body>
+</html>
+"""
+
+
+class GameConfig:
+    def __init__(self, assets: int = 4, asset_kb: int = 64, latency_ms: int = 0, api_latency_ms: int = 0):
+        self.assets = assets
+        self.asset_kb = asset_kb
+        self.latency_ms = latency_ms
+        self.api_latency_ms = api_latency_ms
+        self._bodies = {}
+
+    def page(self) -> bytes:
+        scripts = "\n".join(f'<script src="/static/app{i}.js"></script>' for i in range(self.assets) if i % 2 == 0)
+        styles = "\n".join(f'<link rel="stylesheet" href="/static/app{i}.css">' for i in range(self.assets) if i % 2)
+        return PAGE.format(scripts=scripts, styles=styles).encode("utf-8")
+
+    def asset(self, name: str) -> bytes:
+        if name not in self._bodies:
+            # deterministic filler, commented out so the browser parses it cheaply
+            filler = hashlib.sha256(name.encode("utf-8")).hexdigest() * (self.asset_kb * 1024 // 64 + 1)
+            body = f"/* {filler[:self.asset_kb * 1024]} */\n".encode("utf-8")
+            self._bodies[name] = body
+        return self._bodies[name]
+
+
+def make_handler(config: GameConfig):
+    class GameHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_GET(self):
+            if config.latency_ms:
+                time.sleep(config.latency_ms / 1000)
+            path = urlparse(self.path).path
+            if path in ("/", "/index.html"):
+                self._send(200, config.page(), "text/html; charset=utf-8", {"Cache-Control": "no-cache"})
+            elif path.startswith("/static/app") and path.endswith((".js", ".css")):
+                body = config.asset(path)
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", "text/plain", {"ETag": etag})
+                    return
+                content_type = "application/javascript" if path.endswith(".js") else "text/css"
+                self._send(200, body, content_type, {"ETag": etag, "Cache-Control": "public, max-age=3600"})
+            else:
+                self._send(404, b"not found", "text/plain")
+
+        do_HEAD = do_GET
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b"{}"
+            if config.api_latency_ms:
+                time.sleep(config.api_latency_ms / 1000)
+            try:
+                numbers = json.loads(raw or b"{}").get("numbers", [])
+            except ValueError:
+                numbers = []
+            body = json.dumps({"score": sum(n for n in numbers if isinstance(n, int))}).encode("utf-8")
+            self._send(200, body, "application/json")
+
+    return GameHandler
+
+
+class GameServer:
+    """ThreadingHTTPServer on a background thread; port 0 picks a free port."""
+
+    def __init__(self, config: GameConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or GameConfig()
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.config))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "GameServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="game-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the local benchmark game page")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--assets", type=int, default=4, help="number of static script/stylesheet assets")
+    parser.add_argument("--asset-kb", type=int, default=64, help="size of each asset in KiB")
+    parser.add_argument("--latency-ms", type=int, default=0, help="artificial delay on every GET")
+    parser.add_argument("--api-latency-ms", type=int, default=0, help="artificial delay on the score API")
+    args = parser.parse_args()
+    server = GameServer(GameConfig(args.assets, args.asset_kb, args.latency_ms, args.api_latency_ms), args.host, args.port)
+    print(f"Serving benchmark game at {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
@@ -0,0 +1,268 @@
+# benchmarks/run_benchmark.py
+"""
+End-to-end throughput/latency benchmark: PlannerAgent -> RankerAgent -> OrchestratorAgent
+-> AnalyzerAgent against the local stand-in game (benchmarks/game_server.py).
+
+Every scenario (execution mode x concurrency) runs in a fresh spawned process with its
+own empty working directory, so peak RSS, caches and disk usage are measured per
+scenario. Results are saved as JSON under reports/benchmarks/ for comparing runs.
+
+    python benchmarks/run_benchmark.py --modes async,process --concurrency 1,2,4 --tests 12 --repeats 2
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from game_server import GameConfig, GameServer
+
+RESULTS_DIR = os.path.join(ROOT, "reports", "benchmarks")
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _peak_rss_mb(who) -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _tree_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "mean": None}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 1),
+        "p95": round(float(np.percentile(arr, 95)), 1),
+        "mean": round(float(arr.mean()), 1)
+    }
+
+
+async def _pipeline(scenario: dict, target_url: str) -> dict:
+    from agents.analyzer import AnalyzerAgent
+    from agents.artifacts import get_store, get_writer
+    from agents.orchestrator import OrchestratorAgent
+    from agents.planner import PlannerAgent
+    from agents.ranker import RankerAgent
+
+    run_id = str(uuid.uuid4())
+    timings = {}
+
+    started = time.perf_counter()
+    candidates = await PlannerAgent().generate_tests(target_url, scenario["candidates"], seed=scenario["seed"])
+    timings["plan_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tests = RankerAgent().rank_and_select(candidates, top_k=scenario["tests"])
+    timings["rank_s"] = time.perf_counter() - started
+
+    orchestrator = OrchestratorAgent(
+        pool_size=scenario["pool_size"] or scenario["concurrency"],
+        concurrency=scenario["concurrency"],
+        executor_options={"settle_mode": scenario["settle_mode"], "capture_policy": scenario["capture_policy"]},
+        repeat_mode=scenario["repeat_mode"],
+        http_cache={} if scenario["http_cache"] else None,
+        selector_cache={} if scenario["selector_cache"] else None
+    )
+    analyzer = AnalyzerAgent()
+    report = analyzer.start_report(run_id, {"target_url": target_url, "generated_at": datetime.utcnow().isoformat()})
+
+    run_latency, test_latency, time_to_verdict = [], [], []
+    started = time.perf_counter()
+    async for _, item in orchestrator.iter_results(tests, run_id, scenario["repeats"], mode=scenario["mode"],
+                                                   processes=scenario["processes"]):
+        time_to_verdict.append((time.perf_counter() - started) * 1000)
+        durations = [r.get("duration_ms") or 0.0 for r in item.get("runs", [])]
+        run_latency.extend(durations)
+        test_latency.append(sum(durations))
+        analyzer.add_result(report, item)
+    timings["execute_s"] = time.perf_counter() - started
+    analyzer.finish_report(report, order=[t.get("id") for t in tests])
+
+    os.makedirs(os.path.join("reports", "runs"), exist_ok=True)
+    with open(os.path.join("reports", "runs", f"{run_id}_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    stats = report["stats"]
+    execute_s = timings["execute_s"]
+    return {
+        "tests": stats["total"],
+        "runs": stats["runs"],
+        "passed": stats["passed"],
+        "failed": stats["failed"],
+        "timings_s": {k: round(v, 3) for k, v in timings.items()},
+        "tests_per_sec": round(stats["total"] / execute_s, 3) if execute_s else None,
+        "runs_per_sec": round(stats["runs"] / execute_s, 3) if execute_s else None,
+        "test_latency_ms": _percentiles(test_latency),
+        "run_latency_ms": _percentiles(run_latency),
+        "time_to_verdict_ms": _percentiles(time_to_verdict),
+        # blob store and artifact writer counters of this process plus what shard workers reported back
+        "bytes_written": {"blobs": get_store().bytes_written + orchestrator.worker_bytes_written["blobs"],
+                          "artifacts": get_writer().bytes_written + orchestrator.worker_bytes_written["artifacts"]}
+    }
+
+
+def run_scenario(scenario: dict, target_url: str, workdir: str) -> dict:
+    """Run one scenario in the current process with `workdir` as the working directory."""
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    result = asyncio.run(_pipeline(scenario, target_url))
+    result["peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    # largest single child process (browser driver / renderer / shard worker)
+    result["peak_rss_children_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    # what the scenario left on disk, whichever process wrote it
+    result["disk_usage_bytes"] = _tree_bytes(workdir)
+    result["disk_usage_by_dir"] = {
+        name: _tree_bytes(os.path.join(workdir, "reports", name))
+        for name in ("blobs", "runs", "http_cache") if os.path.isdir(os.path.join(workdir, "reports", name))
+    }
+    return result
+
+
+def _scenario_process(scenario: dict, target_url: str, workdir: str, queue):
+    try:
+        queue.put({"ok": True, "result": run_scenario(scenario, target_url, workdir)})
+    except BaseException as e:
+        queue.put({"ok": False, "error": repr(e)})
+
+
+def run_isolated(scenario: dict, target_url: str, workdir: str, timeout: float) -> dict:
+    """Run a scenario in a freshly spawned process so its RSS and caches start from zero."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_scenario_process, args=(scenario, target_url, workdir, queue))
+    proc.start()
+    try:
+        outcome = queue.get(timeout=timeout)
+    except Exception:
+        outcome = {"ok": False, "error": f"timed out after {timeout}s"}
+    proc.join(5)
+    if proc.is_alive():
+        proc.terminate()
+        proc.join()
+    if not outcome["ok"]:
+        raise RuntimeError(outcome["error"])
+    return outcome["result"]
+
+
+def _csv(value: str, cast=str) -> list:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the plan/rank/execute/analyze pipeline locally")
+    parser.add_argument("--modes", default="async", help="comma-separated execution modes (async,process)")
+    parser.add_argument("--concurrency", default="1,2,4", help="comma-separated concurrency levels")
+    parser.add_argument("--tests", type=int, default=8, help="tests selected by the ranker")
+    parser.add_argument("--candidates", type=int, default=100, help="candidates generated by the planner")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--repeat-mode", default="fixed", choices=("fixed", "adaptive"))
+    parser.add_argument("--processes", type=int, default=None, help="worker processes in process mode")
+    parser.add_argument("--pool-size", type=int, default=None, help="browsers per pool (default: concurrency)")
+    parser.add_argument("--settle-mode", default="fixed", choices=("fixed", "adaptive"))
+    parser.add_argument("--capture-policy", default="always")
+    parser.add_argument("--no-http-cache", action="store_true")
+    parser.add_argument("--no-selector-cache", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--assets", type=int, default=4, help="static assets on the game page")
+    parser.add_argument("--asset-kb", type=int, default=64, help="size of each asset in KiB")
+    parser.add_argument("--latency-ms", type=int, default=20, help="artificial delay on every GET")
+    parser.add_argument("--api-latency-ms", type=int, default=10, help="artificial delay on the score API")
+    parser.add_argument("--timeout", type=float, default=1800, help="per-scenario timeout in seconds")
+    parser.add_argument("--label", default=None, help="free-form label stored with the results")
+    parser.add_argument("--keep-workdirs", action="store_true", help="keep each scenario's reports tree")
+    args = parser.parse_args(argv)
+
+    config = GameConfig(args.assets, args.asset_kb, args.latency_ms, args.api_latency_ms)
+    scratch = tempfile.mkdtemp(prefix="game-bench-")
+    results = []
+    with GameServer(config) as server:
+        for mode in _csv(args.modes):
+            for concurrency in _csv(args.concurrency, int):
+                scenario = {
+                    "mode": mode,
+                    "concurrency": concurrency,
+                    "processes": args.processes,
+                    "pool_size": args.pool_size,
+                    "tests": args.tests,
+                    "candidates": args.candidates,
+                    "repeats": args.repeats,
+                    "repeat_mode": args.repeat_mode,
+                    "settle_mode": args.settle_mode,
+                    "capture_policy": args.capture_policy,
+                    "http_cache": not args.no_http_cache,
+                    "selector_cache": not args.no_selector_cache,
+                    "seed": args.seed
+                }
+                workdir = os.path.join(scratch, f"{mode}-c{concurrency}")
+                print(f"[bench] mode={mode} concurrency={concurrency} ...", flush=True)
+                try:
+                    metrics = run_isolated(scenario, server.url, workdir, args.timeout)
+                    entry = {"scenario": scenario, "metrics": metrics}
+                    print(f"[bench]   {metrics['tests_per_sec']} tests/s, run p50/p95 "
+                          f"{metrics['run_latency_ms']['p50']}/{metrics['run_latency_ms']['p95']} ms, "
+                          f"peak RSS {metrics['peak_rss_mb']} MB, {metrics['disk_usage_bytes']} bytes on disk", flush=True)
+                except Exception as e:
+                    entry = {"scenario": scenario, "error": str(e)}
+                    print(f"[bench]   failed: {e}", flush=True)
+                results.append(entry)
+
+    if args.keep_workdirs:
+        print(f"[bench] scenario working directories kept under {scratch}")
+    else:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    payload = {
+        "label": args.label,
+        "created_at": datetime.utcnow().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "game": {
+            "assets": args.assets, "asset_kb": args.asset_kb,
+            "latency_ms": args.latency_ms, "api_latency_ms": args.api_latency_ms
+        },
+        "results": results
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, f"bench_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"[bench] results written to {out_path}")
+    return payload
+
+
+if __name__ == "__main__":
+    main()
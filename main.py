@@ -1,19 +1,46 @@
 import os
 import json
+import asyncio
 import uuid
+import mimetypes
 from datetime import datetime
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from agents.planner import PlannerAgent
-from agents.orchestrator import OrchestratorAgent
-from agents.ranker import RankerAgent
-from agents.analyzer import AnalyzerAgent
+from agents.orchestrator import EXECUTION_MODES, REPEAT_MODES
+from agents.ranker import RankerAgent, SELECTION_MODES
+from agents import rundata
+from agents.artifacts import get_store
+from agents.registry import RunRegistry, RUN_STATES
+from agents.history import TestHistory
+from agents.jobs import JobQueue, JOB_STATES
+from agents.runner import RUNS_DIR, REPEAT_MODE, events_path
+from agents import metrics
 
-RUNS_DIR = "reports/runs"
 os.makedirs(RUNS_DIR, exist_ok=True)
+# executions are retried this many times (worker crash, lost lease or error) before the run is marked failed
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# per-test fields returned by /report/{run_id}/summary; the full entries stay in /report/{run_id}
+SUMMARY_FIELDS = ("test_id", "description", "verdict", "reproducibility", "runs_count", "passes", "stopped",
+                  "triage", "error", "executor", "artifacts")
+# artifact text previews and thumbnails are capped at these sizes
+PREVIEW_MAX_BYTES = 64 * 1024
+THUMBNAIL_MAX_WIDTH = 1024
+# a stream with no new events for this long is closed (e.g. the run died with the server)
+STREAM_IDLE_TIMEOUT = float(os.environ.get("STREAM_IDLE_TIMEOUT", "300"))
+
+registry = RunRegistry()
+if registry.created:
+    # first start with a registry: index runs that were written before it existed
+    registry.backfill(RUNS_DIR)
+history = TestHistory()
+jobs = JobQueue()
+# report path -> ((mtime_ns, size), parsed report)
+_report_cache = {}
 
 app = FastAPI(title="Multi-Agent Game Tester POC")
 
@@ -25,72 +52,253 @@ class PlanRequest(BaseModel):
 @app.post("/plan")
 async def plan(req: PlanRequest):
     planner = PlannerAgent()
-    candidates = await planner.generate_tests(req.target_url, req.num_candidates, seed=req.speed)
     run_id = str(uuid.uuid4())
-    payload = {
+    meta = {
         "run_id": run_id,
         "label": req.target_url.replace("https://", ""),
         "target_url": req.target_url,
-        "generated_at": datetime.utcnow().isoformat(),
-        "candidates": candidates
+        "generated_at": datetime.utcnow().isoformat()
     }
     safe_name = req.target_url.replace("https://", "").replace("/", "_")
-    path = os.path.join(RUNS_DIR, f"{safe_name}_{run_id}_candidates.json")
+    path = os.path.join(RUNS_DIR, f"{safe_name}_{run_id}_candidates.jsonl")
+    count = await planner.write_candidates(path, req.target_url, req.num_candidates, seed=req.speed, header=meta)
+    registry.register(run_id, req.target_url, path, label=meta["label"], created_at=meta["generated_at"])
+    return {"run_id": run_id, "candidates_count": count}
 
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
-    return {"run_id": run_id, "candidates_count": len(candidates)}
+def _run_file(run_id: str, field: str) -> Optional[str]:
+    run = registry.get(run_id)
+    path = run.get(field) if run else None
+    return path if path and os.path.exists(path) else None
 
 @app.post("/rank")
-async def rank(run_id: str, top_k: int = 10):
-    matches = [f for f in os.listdir(RUNS_DIR) if f.endswith(f"{run_id}_candidates.json")]
-    if not matches:
+async def rank(run_id: str, top_k: int = 10, mode: str = "score", use_history: bool = True):
+    if mode not in SELECTION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(SELECTION_MODES)}")
+    candidates_path = _run_file(run_id, "candidates_path")
+    if not candidates_path:
         raise HTTPException(status_code=404, detail="Run not found")
-    candidates_path = os.path.join(RUNS_DIR, matches[0])
-
-    with open(candidates_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
 
+    # one streaming pass over the candidates; the ranked file only stores references into them
     ranker = RankerAgent()
-    ranked = ranker.rank_and_select(data["candidates"], top_k=top_k)
-    data["top_k"] = ranked
-
+    meta = rundata.read_meta(candidates_path)
+    # past failure rates of identical step sequences on this target feed the ranker's failure_rate weight
+    failure_rate = history.failure_rate(meta.get("target_url")) if use_history else None
+    refs = await asyncio.to_thread(rundata.rank_file, ranker, candidates_path, top_k, mode, failure_rate)
     out_path = os.path.join(RUNS_DIR, f"{run_id}_ranked.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    rundata.write_ranked(out_path, meta, candidates_path, refs, mode)
+    registry.update(run_id, state="ranked", ranked_path=out_path)
 
-    return {"run_id": run_id, "selected": len(ranked)}
+    return {"run_id": run_id, "selected": len(refs)}
 
 @app.post("/execute")
-async def execute(run_id: str, background: BackgroundTasks):
-    matches = [f for f in os.listdir(RUNS_DIR) if f.endswith(f"{run_id}_ranked.json")]
-    if not matches:
+async def execute(run_id: str, mode: str = "async", processes: Optional[int] = None,
+                  repeat_mode: Optional[str] = None):
+    if mode not in EXECUTION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(EXECUTION_MODES)}")
+    repeat_mode = repeat_mode or REPEAT_MODE
+    if repeat_mode not in REPEAT_MODES:
+        raise HTTPException(status_code=400, detail=f"repeat_mode must be one of {list(REPEAT_MODES)}")
+    ranked_path = _run_file(run_id, "ranked_path")
+    if not ranked_path:
         raise HTTPException(status_code=404, detail="Ranked run not found")
-    ranked_path = os.path.join(RUNS_DIR, matches[0])
-
-    background.add_task(_execute_run, run_id, ranked_path)
-    return {"status": "started", "run_id": run_id}
-
-async def _execute_run(run_id: str, ranked_path: str):
-    with open(ranked_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    active = jobs.latest_for_run(run_id)
+    if active and active["state"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Run already has a {active['state']} job {active['job_id']}")
 
-    top_k = data.get("top_k", [])
-    orchestrator = OrchestratorAgent()
-    results = await orchestrator.execute_tests(top_k, run_id)
-    analyzer = AnalyzerAgent()
-    report = analyzer.analyze_run(run_id, data, results)
-
-    out_path = os.path.join(RUNS_DIR, f"{run_id}_report.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(report, f, indent=2)
+    # create the event log up front so /report/{run_id}/stream works as soon as this returns;
+    # the run itself is picked up by a worker process (python worker.py)
+    with open(events_path(run_id), "w", encoding="utf-8") as f:
+        f.write(json.dumps({"event": "queued", "run_id": run_id, "mode": mode}) + "\n")
+    registry.update(run_id, state="queued", events_path=events_path(run_id))
+    job = jobs.enqueue(run_id, {"ranked_path": ranked_path, "mode": mode, "processes": processes,
+                                "repeat_mode": repeat_mode}, max_attempts=JOB_MAX_ATTEMPTS)
+    return {"status": "queued", "run_id": run_id, "job_id": job["job_id"], "mode": mode, "repeat_mode": repeat_mode}
 
 @app.get("/report/{run_id}")
 async def get_report(run_id: str):
-    matches = [f for f in os.listdir(RUNS_DIR) if f.endswith(f"{run_id}_report.json")]
-    if not matches:
+    path = _run_file(run_id, "report_path")
+    if not path:
         raise HTTPException(status_code=404, detail="Report not found")
-    path = os.path.join(RUNS_DIR, matches[0])
+    return await asyncio.to_thread(_load_report, path)
+
+def _load_report(path: str) -> dict:
+    # parsed reports are reused until the file changes, so paging through a large report parses it once
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _report_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
-    return data 
+    if len(_report_cache) >= 16:
+        _report_cache.pop(next(iter(_report_cache)))
+    _report_cache[path] = (version, data)
+    return data
+
+@app.get("/report/{run_id}/summary")
+async def report_summary(run_id: str, offset: int = 0, limit: int = 25, verdict: Optional[str] = None,
+                         triage: Optional[str] = None):
+    """One page of test summaries, optionally filtered by verdict and by a substring of the triage notes."""
+    path = _run_file(run_id, "report_path")
+    if not path:
+        raise HTTPException(status_code=404, detail="Report not found")
+    report = await asyncio.to_thread(_load_report, path)
+    offset = max(0, offset)
+    limit = max(1, min(limit, 200))
+    tests = report.get("summary", [])
+    if verdict:
+        tests = [t for t in tests if t.get("verdict") == verdict]
+    if triage:
+        needle = triage.lower()
+        tests = [t for t in tests if any(needle in str(note).lower() for note in t.get("triage") or [])]
+    return {
+        "run_id": run_id,
+        "status": report.get("status"),
+        "target_url": report.get("target_url"),
+        "stats": report.get("stats", {}),
+        "total": len(tests),
+        "offset": offset,
+        "limit": limit,
+        "tests": [{k: t.get(k) for k in SUMMARY_FIELDS} for t in tests[offset:offset + limit]]
+    }
+
+@app.get("/runs")
+async def list_runs(state: Optional[str] = None, target_url: Optional[str] = None, limit: int = 50, offset: int = 0):
+    if state and state not in RUN_STATES:
+        raise HTTPException(status_code=400, detail=f"state must be one of {list(RUN_STATES)}")
+    limit = max(1, min(limit, 500))
+    runs = registry.list_runs(state=state, target_url=target_url, limit=limit, offset=offset)
+    return {"runs": runs, "limit": limit, "offset": offset}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    metrics.RUNS.clear()
+    for state in RUN_STATES:
+        metrics.RUNS.set(0, state=state)
+    for state, count in registry.count_by_state().items():
+        metrics.RUNS.set(count, state=state)
+    for state in JOB_STATES:
+        metrics.JOBS.set(0, state=state)
+    for state, count in jobs.count_by_state().items():
+        metrics.JOBS.set(count, state=state)
+    # executions happen in worker processes, which publish their metrics as snapshot files
+    snapshots = await asyncio.to_thread(metrics.load_snapshots, metrics.SNAPSHOT_DIR)
+    return Response(content=metrics.REGISTRY.render(snapshots), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/history/flaky")
+async def flaky_tests(target_url: Optional[str] = None, days: Optional[int] = 30, limit: int = 20, min_runs: int = 2):
+    limit = max(1, min(limit, 500))
+    tests = history.flakiest(target_url=target_url, days=days, limit=limit, min_runs=min_runs)
+    return {"tests": tests, "days": days, "limit": limit}
+
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str):
+    run = registry.get(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    run["job"] = jobs.latest_for_run(run_id)
+    return run
+
+@app.get("/report/{run_id}/stream")
+async def stream_report(run_id: str):
+    """Newline-delimited JSON: a "started" event, one "result" per test as it finishes, then "done" or "error"."""
+    path = events_path(run_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Run has not started")
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        last_event = loop.time()
+        partial = ""
+        with open(path, "r", encoding="utf-8") as f:
+            while True:
+                chunk = f.readline()
+                if not chunk or not chunk.endswith("\n"):
+                    # nothing new yet, or a line that is still being written
+                    partial += chunk
+                    if loop.time() - last_event > STREAM_IDLE_TIMEOUT:
+                        return
+                    await asyncio.sleep(0.25)
+                    continue
+                line, partial = partial + chunk, ""
+                last_event = loop.time()
+                yield line
+                if json.loads(line).get("event") in ("done", "error"):
+                    return
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _media_type(key: str) -> str:
+    if key.endswith(".log"):
+        return "text/plain"
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+def _byte_range(header: str, size: int) -> Optional[tuple]:
+    """(offset, length) for a single-range "bytes=..." header; None when it cannot be satisfied."""
+    unit, _, spec = header.partition("=")
+    start, sep, end = spec.strip().partition("-")
+    if unit.strip() != "bytes" or not sep or "," in spec:
+        return None
+    try:
+        if not start:
+            length = min(int(end), size)
+            return (size - length, length) if length > 0 else None
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    return (start, end - start + 1) if start <= end else None
+
+@app.get("/artifact/{run_id}/{key:path}")
+async def get_artifact(run_id: str, key: str, range_header: Optional[str] = Header(None, alias="Range")):
+    store = get_store()
+    if range_header:
+        # e.g. "bytes=0-4095" or "bytes=-4096" (the last 4 KiB)
+        head = await asyncio.to_thread(store.open_artifact_range, run_id, key, 0, 0)
+        if head is None:
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        size = head[1]
+        span = _byte_range(range_header, size)
+        if span is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        data, _ = await asyncio.to_thread(store.open_artifact_range, run_id, key, span[0], span[1])
+        return Response(content=data, status_code=206, media_type=_media_type(key), headers={
+            "Content-Range": f"bytes {span[0]}-{span[0] + len(data) - 1}/{size}", "Accept-Ranges": "bytes"
+        })
+    data = await asyncio.to_thread(store.open_artifact, run_id, key)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return Response(content=data, media_type=_media_type(key), headers={"Accept-Ranges": "bytes"})
+
+@app.get("/preview/{run_id}/{key:path}")
+async def preview_artifact(run_id: str, key: str, offset: int = 0, length: int = 2000):
+    """Up to `length` bytes of a text artifact as JSON; a negative `offset` reads from the end (e.g. a log's tail)."""
+    length = max(1, min(length, PREVIEW_MAX_BYTES))
+    part = await asyncio.to_thread(get_store().open_artifact_range, run_id, key, offset, length)
+    if part is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    data, size = part
+    start = max(0, size + offset) if offset < 0 else min(offset, size)
+    return {
+        "key": key,
+        "size": size,
+        "offset": start,
+        "length": len(data),
+        "truncated": start > 0 or start + len(data) < size,
+        "text": data.decode("utf-8", errors="replace")
+    }
+
+@app.get("/thumbnail/{run_id}/{key:path}")
+async def artifact_thumbnail(run_id: str, key: str, width: int = 320):
+    # widths are rounded to 32 px so the thumbnail cache holds a handful of sizes per screenshot
+    width = max(32, min(THUMBNAIL_MAX_WIDTH, round(width / 32) * 32))
+    try:
+        thumb = await asyncio.to_thread(get_store().thumbnail, run_id, key, width)
+    except ImportError:
+        # Pillow not installed: fall back to the full image
+        return await get_artifact(run_id, key, range_header=None)
+    except OSError:
+        raise HTTPException(status_code=415, detail="Artifact is not an image")
+    if thumb is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return Response(content=thumb, media_type="image/jpeg")
@@ -1,58 +1,227 @@
 # scripts/ingest_knowledge.py
 import os
+import sys
 import json
 import glob
+import hashlib
+import argparse
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
 from dotenv import load_dotenv
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.embeddings import bump_index_version, default_spec, get_embeddings, load_backend, record_backend
+
 
 # persist dir for vector DB
 PERSIST_DIR = "knowledge_store"
 REPORTS_GLOB = "reports/runs/**/*.json"  # will pick up your report files
+# per-source content hash and chunk ids, so re-ingest only embeds what changed
+MANIFEST_NAME = "ingest_manifest.json"
+
+# keys that carry no retrievable meaning (paths, timestamps, bookkeeping)
+NOISE_KEYS = {
+    "artifacts", "manifest", "started_at", "generated_at", "analyzed_at", "settle_ms",
+    "candidates_path", "step_timings", "notes", "executor"
+}
+
+def _line(*parts):
+    return " ".join(p for p in parts if p)
+
+def _test_document(test, context, path):
+    """Compact text + filterable metadata for one analyzed test."""
+    verdict = test.get("verdict") or ({True: "pass", False: "fail"}.get(test.get("ok")) if "ok" in test else "unknown")
+    triage = test.get("triage") or []
+    if isinstance(triage, str):
+        triage = [triage]
+    runs = test.get("runs_count")
+    text = "\n".join(filter(None, [
+        _line(f"Test {test.get('test_id')}", f"on {context['target_url']}" if context.get("target_url") else None,
+              f"verdict {verdict}"),
+        f"Reproducibility {test['reproducibility']} over {runs} runs." if test.get("reproducibility") is not None else None,
+        f"Description: {test['description']}" if test.get("description") else None,
+        f"Error: {test['error']}" if test.get("error") else None,
+        f"Triage: {'; '.join(triage)}" if triage else None
+    ]))
+    metadata = {
+        "source": path,
+        "kind": "test_result",
+        "run_id": context.get("run_id") or "",
+        "target_url": context.get("target_url") or "",
+        "test_id": test.get("test_id") or "",
+        "verdict": verdict,
+        "has_error": bool(test.get("error"))
+    }
+    if test.get("reproducibility") is not None:
+        metadata["reproducibility"] = float(test["reproducibility"])
+    return Document(page_content=text, metadata=metadata)
+
+def _strip_noise(value):
+    if isinstance(value, dict):
+        return {k: _strip_noise(v) for k, v in value.items() if k not in NOISE_KEYS}
+    if isinstance(value, list):
+        return [_strip_noise(v) for v in value]
+    return value
+
+def report_documents(path, j):
+    """
+    Report-aware documents for one JSON file under reports/runs: one compact document per
+    analyzed test with verdict/triage/description/error as text and filterable metadata.
+    Plans, rankings, artifact manifests and reports still being written yield nothing.
+    """
+    if not isinstance(j, dict):
+        return []
+    if "summary" in j:
+        if j.get("status") == "running":
+            return []
+        return [_test_document(t, j, path) for t in j["summary"] if isinstance(t, dict)]
+    if "results" in j:
+        # legacy run_summary.json
+        return [_test_document(t, j, path) for t in j["results"] if isinstance(t, dict)]
+    if "test_id" in j:
+        # legacy per-test report.json
+        return [_test_document(j, {}, path)]
+    if "top_k" in j or "candidates" in j or os.path.basename(path) == "manifest.json":
+        return []
+    text = json.dumps(_strip_noise(j), separators=(",", ":"), ensure_ascii=False)
+    return [Document(page_content=text, metadata={"source": path, "kind": "other"})]
+
+def load_report_documents(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            j = json.load(f)
+    except Exception:
+        return []
+    return report_documents(path, j)
+
+def load_extra_doc(path):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    return [Document(page_content=text, metadata={"source": path, "kind": "knowledge"})]
 
 def load_json_reports(pattern=REPORTS_GLOB):
-    docs = []
-    for path in glob.glob(pattern, recursive=True):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                j = json.load(f)
-        except Exception:
-            continue
-        # stringify JSON into text (you can choose to extract fields more precisely)
-        text = json.dumps(j, indent=2)
-        docs.append(Document(page_content=text, metadata={"source": path}))
-    return docs
+    return [d for path in glob.glob(pattern, recursive=True) for d in load_report_documents(path)]
 
 def load_extra_docs(folder="knowledge_base"):
-    docs = []
+    return [d for path in extra_doc_paths(folder) for d in load_extra_doc(path)]
+
+def extra_doc_paths(folder="knowledge_base"):
     if not os.path.isdir(folder):
-        return docs
-    for path in glob.glob(os.path.join(folder, "**/*.*"), recursive=True):
-        if path.lower().endswith((".md", ".txt", ".json")):
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
-            docs.append(Document(page_content=text, metadata={"source": path}))
-    return docs
-
-def ingest_all(persist_dir=PERSIST_DIR):
-    docs = load_json_reports() + load_extra_docs()
-    if not docs:
+        return []
+    return [
+        path for path in glob.glob(os.path.join(folder, "**/*.*"), recursive=True)
+        if path.lower().endswith((".md", ".txt", ".json"))
+    ]
+
+def discover_sources(pattern=REPORTS_GLOB, folder="knowledge_base"):
+    """Map of source path -> loader (returning a list of Documents) for everything that should be in the index."""
+    sources = {path: load_report_documents for path in glob.glob(pattern, recursive=True)}
+    sources.update({path: load_extra_doc for path in extra_doc_paths(folder)})
+    return sources
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_ids(chunks):
+    """Content-derived ids: the same chunk text from the same source always gets the same id."""
+    ids, seen = [], {}
+    for chunk in chunks:
+        base = hashlib.sha256(f"{chunk.metadata['source']}\n{chunk.page_content}".encode("utf-8")).hexdigest()[:32]
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        ids.append(base if n == 0 else f"{base}-{n}")
+    return ids
+
+def load_manifest(persist_dir=PERSIST_DIR):
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, persist_dir=PERSIST_DIR):
+    os.makedirs(persist_dir, exist_ok=True)
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def ingest_all(persist_dir=PERSIST_DIR, rebuild=False):
+    """
+    Incrementally sync the vector store with reports/runs and knowledge_base.
+    Sources whose size/mtime (then sha256) are unchanged are skipped without re-chunking;
+    changed sources only embed chunks whose ids are new, and chunks of changed or deleted
+    sources that no longer exist are removed. Without a manifest (or with rebuild=True)
+    the collection is rebuilt from scratch, since earlier vectors carry no stable ids.
+    A rebuild embeds with the RAG_EMBEDDINGS backend and records it next to the index;
+    incremental runs keep using whichever backend the index was built with.
+    """
+    manifest = None if rebuild else load_manifest(persist_dir)
+    rebuilt = manifest is None
+    spec = default_spec() if rebuilt else load_backend(persist_dir)
+    embeddings = get_embeddings(persist_dir, spec=spec)
+    db = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+    if rebuilt:
+        db.delete_collection()
+        db = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+        record_backend(spec, persist_dir)
+        manifest = {"files": {}}
+
+    files = manifest["files"]
+    sources = discover_sources()
+    if not sources and not files:
         print("No docs found to ingest. Put some JSONs in reports/runs or docs in knowledge_base/")
+        if rebuilt:
+            bump_index_version(persist_dir)
         return
 
-    # split into chunks
     splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-    chunks = splitter.split_documents(docs)
+    new_chunks, new_ids, stale_ids = [], [], []
+    unchanged = 0
+    for path, loader in sorted(sources.items()):
+        st = os.stat(path)
+        entry = files.get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            unchanged += 1
+            continue
+        digest = file_sha256(path)
+        if entry and entry["sha256"] == digest:
+            entry.update(size=st.st_size, mtime=st.st_mtime)
+            unchanged += 1
+            continue
+        chunks = splitter.split_documents(loader(path))
+        ids = chunk_ids(chunks)
+        old = set(entry["chunks"]) if entry else set()
+        for chunk, chunk_id in zip(chunks, ids):
+            if chunk_id not in old:
+                new_chunks.append(chunk)
+                new_ids.append(chunk_id)
+        stale_ids.extend(old - set(ids))
+        files[path] = {"sha256": digest, "size": st.st_size, "mtime": st.st_mtime, "chunks": ids}
+
+    for path in set(files) - set(sources):
+        stale_ids.extend(files.pop(path)["chunks"])
 
-    # embeddings + chroma
-    embeddings = OpenAIEmbeddings()
-    db = Chroma.from_documents(chunks, embeddings, persist_directory=persist_dir)
+    if stale_ids:
+        db.delete(ids=stale_ids)
+    if new_chunks:
+        db.add_documents(new_chunks, ids=new_ids)
     db.persist()
-    print(f"Persisted {len(chunks)} chunks into {persist_dir}")
+    save_manifest(manifest, persist_dir)
+    if stale_ids or new_chunks or rebuilt:
+        # tells long-lived RetrieverService instances to drop their caches
+        bump_index_version(persist_dir)
+    print(f"Embedded {len(new_chunks)} new chunks, removed {len(stale_ids)}, "
+          f"skipped {unchanged} unchanged sources in {persist_dir}")
 
 if __name__ == "__main__":
-    ingest_all()
+    parser = argparse.ArgumentParser(description="Incrementally ingest reports and docs into the vector store")
+    parser.add_argument("--rebuild", action="store_true", help="drop the collection and re-embed everything")
+    args = parser.parse_args()
+    ingest_all(rebuild=args.rebuild)
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# the agents package is imported from the repository root, as main.py and worker.py do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
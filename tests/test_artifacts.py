@@ -0,0 +1,52 @@
+# tests/test_artifacts.py
+import pytest
+
+from agents.artifacts import ArtifactStore, should_capture
+
+
+def _store(tmp_path):
+    return ArtifactStore(root=tmp_path / "blobs", runs_dir=tmp_path / "runs", thumbnails_dir=tmp_path / "thumbs")
+
+
+def test_legacy_path_stays_inside_runs_dir(tmp_path):
+    store = _store(tmp_path)
+    inside = tmp_path / "runs" / "r1" / "t1" / "console.log"
+    inside.parent.mkdir(parents=True)
+    inside.write_text("ok")
+    outside = tmp_path / "secret.txt"
+    outside.write_text("no")
+    assert store._legacy_path(str(inside)) == inside
+    assert store._legacy_path(str(outside)) is None
+    assert store._legacy_path(str(tmp_path / "runs" / ".." / "secret.txt")) is None
+    assert store._legacy_path(str(tmp_path / "runs" / "r1" / "missing.log")) is None
+
+
+def test_put_deduplicates_content(tmp_path):
+    store = _store(tmp_path)
+    first = store.put("dom.html", b"<html>" * 100)
+    written = store.bytes_written
+    second = store.put("other.html", b"<html>" * 100)
+    assert first == second and first["encoding"] == "gzip"
+    assert store.bytes_written == written
+    assert store.put("shot.png", b"\x89PNG")["encoding"] == "identity"
+
+
+def test_manifest_and_range_reads(tmp_path):
+    store = _store(tmp_path)
+    entry = store.put("console.log", b"0123456789")
+    store.write_manifest("r1", {"t1/r0/console.log": entry})
+    assert store.open_artifact("r1", "t1/r0/console.log") == b"0123456789"
+    assert store.open_artifact_range("r1", "t1/r0/console.log", 2, 3) == (b"234", 10)
+    assert store.open_artifact_range("r1", "t1/r0/console.log", -4) == (b"6789", 10)
+    assert store.open_artifact("r1", "missing") is None
+
+
+def test_should_capture_policies():
+    assert should_capture("on-failure", failed=True, repeat=3)
+    assert not should_capture("on-failure", failed=False, repeat=0)
+    assert should_capture("first-repeat", failed=False, repeat=0)
+    assert not should_capture("first-repeat", failed=False, repeat=1)
+    assert should_capture("sampled", False, 0, key="k", sample_rate=1.0)
+    assert not should_capture("sampled", False, 0, key="k", sample_rate=0.0)
+    with pytest.raises(ValueError):
+        should_capture("never", False, 0)
@@ -0,0 +1,46 @@
+# tests/test_console_capture.py
+import pytest
+
+from agents.artifacts import ArtifactWriter
+from agents.console_capture import ConsoleCapture
+
+
+def test_level_filter_and_tail(tmp_path):
+    writer = ArtifactWriter()
+    capture = ConsoleCapture(tmp_path / "c.log.part", writer, min_level="warning", rate_limit=None, tail_size=2)
+    for kind in ("debug", "log", "warning", "error", "pageerror"):
+        capture.add(kind, kind)
+    capture.close()
+    writer.flush_sync()
+    assert capture.filtered == 2
+    assert capture.errors == 2
+    assert list(capture.tail) == ["[error] error", "[pageerror] pageerror"]
+    assert (tmp_path / "c.log.part").read_text().splitlines() == ["[warning] warning", "[error] error",
+                                                                  "[pageerror] pageerror"]
+
+
+def test_rate_limit_suppresses_bursts_and_logs_the_count(tmp_path):
+    writer = ArtifactWriter()
+    capture = ConsoleCapture(tmp_path / "c.log.part", writer, rate_limit=1.0)
+    for i in range(10):
+        capture.add("log", f"spam {i}")
+    capture.close()
+    writer.flush_sync()
+    assert capture.suppressed == 8  # bursts of up to twice the rate get through
+    assert capture.tail[-1] == "[capture] suppressed 8 log messages (rate limit 1/s)"
+
+
+def test_a_new_capture_starts_from_an_empty_file(tmp_path):
+    part = tmp_path / "c.log.part"
+    part.write_text("left over from an earlier attempt\n")
+    writer = ArtifactWriter()
+    capture = ConsoleCapture(part, writer)
+    capture.add("log", "fresh")
+    capture.close()
+    writer.flush_sync()
+    assert part.read_text() == "[log] fresh\n"
+
+
+def test_unknown_level_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ConsoleCapture(tmp_path / "c.log.part", ArtifactWriter(), min_level="verbose")
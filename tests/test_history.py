@@ -0,0 +1,32 @@
+# tests/test_history.py
+from agents import history as history_store
+from agents.history import latency_percentile
+
+CASE = {"id": "t1", "steps": [{"action": "click", "selector": "#go"}]}
+SPLIT = [{"ok": True, "duration_ms": 120}, {"ok": False, "error": "boom", "duration_ms": 900}]
+
+
+def test_record_returns_prior_stats_and_accumulates(tmp_path):
+    history = history_store.TestHistory(str(tmp_path / "history.sqlite3"))
+    assert history.record("http://game", CASE, SPLIT, "r1") is None
+    prior = history.record("http://game", CASE, SPLIT, "r2")
+    assert (prior["runs"], prior["passes"], prior["flaky"]) == (2, 1, 1)
+    stats = history.get("http://game", CASE)
+    assert (stats["analyses"], stats["runs"], stats["last_error"]) == (2, 4, "boom")
+
+
+def test_recording_the_same_execution_twice_is_idempotent(tmp_path):
+    history = history_store.TestHistory(str(tmp_path / "history.sqlite3"))
+    history.record("http://game", CASE, SPLIT, "r1")
+    first = history.record("http://game", CASE, SPLIT, "r2", execution_id="job-1")
+    again = history.record("http://game", CASE, SPLIT, "r2", execution_id="job-1")
+    assert again == first
+    assert history.get("http://game", CASE)["analyses"] == 2
+    history.record("http://game", CASE, SPLIT, "r2", execution_id="job-2")
+    assert history.get("http://game", CASE)["analyses"] == 3
+
+
+def test_latency_percentile():
+    assert latency_percentile([0] * 11, 0.5) is None
+    assert latency_percentile([1, 0, 0, 1] + [0] * 7, 0.5) == 100.0
+    assert latency_percentile([0] * 10 + [5], 0.95) == 60000.0
@@ -0,0 +1,40 @@
+# tests/test_http_cache.py
+import time
+from email.utils import formatdate
+
+from agents.http_cache import ResponseCache
+
+lifetime = ResponseCache.freshness_lifetime
+
+
+def test_max_age_minus_age():
+    assert lifetime({"cache-control": "public, max-age=600"}) == 600
+    assert lifetime({"cache-control": "max-age=600", "age": "100"}) == 500
+    assert lifetime({"cache-control": "max-age=60", "age": "100"}) == 0
+
+
+def test_no_cache_and_no_store_always_revalidate():
+    assert lifetime({"cache-control": "no-cache, max-age=600"}) == 0
+    assert lifetime({"cache-control": "no-store"}) == 0
+
+
+def test_expires_relative_to_date():
+    now = time.time()
+    headers = {"date": formatdate(now, usegmt=True), "expires": formatdate(now + 3600, usegmt=True)}
+    assert lifetime(headers) == 3600
+    headers["cache-control"] = "max-age=10"
+    assert lifetime(headers) == 10  # max-age wins over Expires
+
+
+def test_missing_or_invalid_lifetime_is_zero():
+    assert lifetime({}) == 0
+    assert lifetime({"cache-control": "max-age=soon"}) == 0
+    assert lifetime({"expires": "0"}) == 0
+
+
+def test_is_fresh(tmp_path):
+    cache = ResponseCache(root=tmp_path)
+    meta = {"fetched_at": 1000.0, "headers": {"cache-control": "max-age=60"}}
+    assert cache.is_fresh(meta, now=1059.0)
+    assert not cache.is_fresh(meta, now=1061.0)
+    assert not cache.is_fresh({"headers": {"cache-control": "max-age=60"}}, now=1000.0)
@@ -0,0 +1,68 @@
+# tests/test_jobs.py
+import time
+
+from agents.jobs import JobQueue
+
+
+def _queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claim_takes_the_oldest_job_once(tmp_path):
+    jobs = _queue(tmp_path)
+    first = jobs.enqueue("run-1", {"n": 1})
+    jobs.enqueue("run-2", {"n": 2})
+    claimed = jobs.claim("w1")
+    assert claimed["job_id"] == first["job_id"]
+    assert claimed["state"] == "running" and claimed["attempts"] == 1
+    assert claimed["payload"] == {"n": 1}
+    assert jobs.claim("w2")["run_id"] == "run-2"
+    assert jobs.claim("w3") is None
+
+
+def test_enqueue_returns_the_active_job_for_a_run(tmp_path):
+    jobs = _queue(tmp_path)
+    assert jobs.enqueue("run-1", {})["job_id"] == jobs.enqueue("run-1", {})["job_id"]
+
+
+def test_fail_retries_with_backoff_until_attempts_run_out(tmp_path):
+    jobs = _queue(tmp_path)
+    job = jobs.enqueue("run-1", {}, max_attempts=2)
+    jobs.claim("w1")
+    assert jobs.fail(job["job_id"], "w1", "boom", retry_delay=60) == "queued"
+    assert jobs.claim("w1") is None  # backing off
+    jobs.fail(job["job_id"], "w1", "boom", retry_delay=0)  # not ours any more: ignored
+    jobs._write("UPDATE jobs SET available_at = 0 WHERE job_id = ?", (job["job_id"],))
+    assert jobs.claim("w2")["attempts"] == 2
+    assert jobs.fail(job["job_id"], "w2", "boom again", retry_delay=0) == "failed"
+    assert jobs.get(job["job_id"])["error"] == "boom again"
+
+
+def test_fail_from_another_worker_is_ignored(tmp_path):
+    jobs = _queue(tmp_path)
+    job = jobs.enqueue("run-1", {})
+    jobs.claim("w1")
+    assert jobs.fail(job["job_id"], "w2", "not mine") is None
+    assert jobs.get(job["job_id"])["state"] == "running"
+
+
+def test_requeue_stale_releases_expired_leases(tmp_path):
+    jobs = _queue(tmp_path)
+    job = jobs.enqueue("run-1", {}, max_attempts=1)
+    jobs.claim("w1", lease_seconds=-1)
+    released = jobs.requeue_stale()
+    assert [(j["job_id"], j["state"]) for j in released] == [(job["job_id"], "failed")]
+    assert "w1" in released[0]["error"]
+
+
+def test_heartbeat_keeps_a_lease_and_release_returns_the_attempt(tmp_path):
+    jobs = _queue(tmp_path)
+    job = jobs.enqueue("run-1", {})
+    jobs.claim("w1", lease_seconds=1)
+    assert jobs.heartbeat(job["job_id"], "w1", lease_seconds=60)
+    assert jobs.get(job["job_id"])["lease_until"] > time.time() + 30
+    assert not jobs.heartbeat(job["job_id"], "w2")
+    assert jobs.requeue_stale() == []
+    assert jobs.release(job["job_id"], "w1")
+    assert jobs.get(job["job_id"])["attempts"] == 0
+    assert jobs.count_by_state() == {"queued": 1}
@@ -0,0 +1,39 @@
+# tests/test_orchestrator.py
+import asyncio
+
+import pytest
+
+from agents.orchestrator import OrchestratorAgent, repeat_decision
+
+
+def test_repeat_decision_unanimous():
+    assert repeat_decision(3, 3) == "unanimous"
+    assert repeat_decision(0, 2) == "unanimous"
+
+
+def test_repeat_decision_needs_more_runs_when_split():
+    assert repeat_decision(0, 0) is None
+    assert repeat_decision(1, 2) is None
+    assert repeat_decision(4, 8) is None
+
+
+def test_repeat_decision_confident_once_the_interval_excludes_half():
+    assert repeat_decision(29, 30) == "confident"
+    assert repeat_decision(1, 30) == "confident"
+
+
+def test_stop_reason_respects_max_repeats_and_budget():
+    orchestrator = OrchestratorAgent(repeat_mode="adaptive", max_repeats=2)
+    split = {0: {"ok": True}, 1: {"ok": False}}
+    assert orchestrator._stop_reason(split, None) == "max_repeats"
+    orchestrator.max_repeats = 8
+    assert orchestrator._stop_reason(split, 0) == "budget"
+    assert orchestrator._stop_reason(split, 1) is None
+
+
+def test_iter_results_rejects_non_positive_repeats():
+    async def run():
+        return await OrchestratorAgent().execute_tests([{"id": "t1", "steps": []}], "run", repeats=0)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
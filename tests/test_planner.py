@@ -0,0 +1,19 @@
+# tests/test_planner.py
+import asyncio
+
+from agents.planner import PlannerAgent, _SeenFilter, step_signature
+
+
+def test_same_seed_same_candidates_without_duplicates():
+    first = asyncio.run(PlannerAgent().generate_tests("http://game", 200, seed=7))
+    second = asyncio.run(PlannerAgent().generate_tests("http://game", 200, seed=7))
+    assert first == second
+    assert len({step_signature(c["steps"]) for c in first}) == len(first) == 200
+
+
+def test_seen_filter_reports_repeats():
+    seen = _SeenFilter(100)
+    signature = step_signature([{"action": "click", "selector": "#go"}])
+    assert not seen.add(signature)
+    assert seen.add(signature)
+    assert len(_SeenFilter(10 ** 9).bits) <= 16 * 1024 * 1024
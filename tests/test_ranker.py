@@ -0,0 +1,49 @@
+# tests/test_ranker.py
+import numpy as np
+import pytest
+
+from agents.ranker import RankerAgent, coverage_units
+
+
+def _candidate(i, cost, value="1 2 3"):
+    return {"id": f"t{i}", "estimated_cost": cost,
+            "steps": [{"action": "fill", "selector": "#in", "value": value}, {"action": "click", "selector": "#go"}]}
+
+
+def test_smallest_orders_by_score_then_position():
+    scores = np.array([0.5, 0.1, 0.5, 0.1, 0.9])
+    positions = np.array([10, 11, 12, 13, 14])
+    assert RankerAgent._smallest(scores, positions, 3).tolist() == [1, 3, 0]
+
+
+def test_smallest_keeps_all_when_fewer_than_k():
+    scores = np.array([0.3, 0.2])
+    assert RankerAgent._smallest(scores, np.array([0, 1]), 5).tolist() == [1, 0]
+
+
+def test_chunked_ranking_matches_a_full_stable_sort():
+    candidates = [_candidate(i, cost=(i * 7) % 5) for i in range(50)]
+    chunked = RankerAgent(chunk_size=4).rank_with_scores(candidates, top_k=10)
+    whole = RankerAgent(chunk_size=1000).rank_with_scores(candidates, top_k=10)
+    assert [p for p, _, _ in chunked] == [p for p, _, _ in whole]
+    scores = [s for _, s, _ in chunked]
+    assert scores == sorted(scores)
+
+
+def test_failure_rate_feature_favours_failing_tests():
+    candidates = [_candidate(0, 1.0), _candidate(1, 1.0)]
+    ranked = RankerAgent().rank_and_select(candidates, top_k=1, failure_rate=lambda c: 1.0 if c["id"] == "t1" else 0.0)
+    assert ranked[0]["id"] == "t1"
+
+
+def test_diverse_mode_takes_one_per_class_before_topping_up():
+    candidates = [_candidate(0, 1.0, "1 2 3"), _candidate(1, 1.0, "4 5 6"), _candidate(2, 1.0, "9 8 7")]
+    assert coverage_units(candidates[0]) == coverage_units(candidates[1])
+    picked = RankerAgent().rank_and_select(candidates, top_k=2, mode="diverse")
+    assert {c["id"] for c in picked} in ({"t0", "t2"}, {"t1", "t2"})
+    assert len(RankerAgent().rank_and_select(candidates, top_k=3, mode="diverse")) == 3
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        RankerAgent().rank_and_select([], mode="random")
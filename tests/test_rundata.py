@@ -0,0 +1,47 @@
+# tests/test_rundata.py
+import json
+
+import pytest
+
+from agents import rundata
+from agents.ranker import RankerAgent
+
+
+def _write_candidates(path, count, order=1):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"_meta": {"target_url": "http://game"}}) + "\n")
+        for i in range(count)[::order]:
+            f.write(json.dumps({"id": f"t{i}", "estimated_cost": float(count - i), "steps": []}) + "\n")
+
+
+def test_ranked_references_seek_back_to_the_candidates(tmp_path):
+    path = str(tmp_path / "candidates.jsonl")
+    _write_candidates(path, 20)
+    assert rundata.read_meta(path) == {"target_url": "http://game"}
+    refs = rundata.rank_file(RankerAgent(chunk_size=3), path, top_k=3)
+    assert all(ref["offset"] is not None for ref in refs)
+    candidates = rundata.read_candidates(path, refs)
+    assert [c["id"] for c in candidates] == [ref["id"] for ref in refs]
+
+    ranked = str(tmp_path / "ranked.json")
+    rundata.write_ranked(ranked, {"run_id": "r1"}, path, refs)
+    meta, tests = rundata.load_ranked(ranked)
+    assert meta["run_id"] == "r1" and tests == candidates
+
+
+def test_reading_a_changed_file_fails_loudly(tmp_path):
+    path = str(tmp_path / "candidates.jsonl")
+    _write_candidates(path, 5)
+    refs = rundata.rank_file(RankerAgent(), path, top_k=2)
+    _write_candidates(path, 5, order=-1)
+    with pytest.raises(ValueError):
+        rundata.read_candidates(path, refs)
+
+
+def test_legacy_json_files_are_still_read(tmp_path):
+    path = str(tmp_path / "candidates.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"target_url": "http://game", "candidates": [{"id": "t1", "steps": []}]}, f)
+    assert [offset for offset, _ in rundata.iter_with_offsets(path)] == [None]
+    refs = rundata.rank_file(RankerAgent(), path, top_k=1)
+    assert rundata.read_candidates(path, refs)[0]["id"] == "t1"
@@ -1,11 +1,15 @@
 import streamlit as st
 import requests
-from pathlib import Path
-import time
 import json
+import time
 
 
 API_URL = "http://127.0.0.1:8000"
+# (connect, read) seconds for the live event stream; a read timeout means no event arrived for that long
+STREAM_TIMEOUT = (5, 30)
+# once the stream goes quiet, the report summary is polled this often, for at most POLL_MAX_SECONDS
+POLL_INTERVAL = 3
+POLL_MAX_SECONDS = 1800
 
 st.set_page_config(page_title="Multi-Agent Tester", layout="wide")
 st.title("⚡ Multi-Agent Game Tester")
@@ -14,6 +18,53 @@ st.sidebar.header("Settings")
 target_url = st.sidebar.text_input("Target URL", "https://play.ezygamers.com/")
 num_candidates = st.sidebar.number_input("Number of candidates", min_value=5, max_value=50, value=10)
 top_k = st.sidebar.number_input("Top K", min_value=1, max_value=20, value=5)
+selection_mode = st.sidebar.selectbox("Selection mode", ["score", "diverse"])
+exec_mode = st.sidebar.selectbox("Execution mode", ["async", "process"])
+
+def live_row(test):
+    return {
+        "test_id": test.get("test_id"),
+        "verdict": test.get("verdict"),
+        "reproducibility": test.get("reproducibility"),
+        "triage": "; ".join(test.get("triage") or [])
+    }
+
+def poll_execution(run_id, status, progress):
+    """Fallback when the stream is quiet: poll the run state and the paginated summary until the run ends."""
+    deadline = time.time() + POLL_MAX_SECONDS
+    while time.time() < deadline:
+        run = requests.get(f"{API_URL}/runs/{run_id}", timeout=10).json()
+        job = run.get("job") or {}
+        if run.get("state") == "queued":
+            status.info("Waiting for a worker to claim the job (start one with `python worker.py`)...")
+        elif run.get("state") == "running":
+            status.info(f"Running on {job.get('worker_id') or 'a worker'} (attempt {job.get('attempts')}).")
+        rows, offset = [], 0
+        while True:
+            resp = requests.get(f"{API_URL}/report/{run_id}/summary", params={"offset": offset, "limit": 200},
+                                timeout=10)
+            if resp.status_code != 200:
+                break
+            page = resp.json()
+            rows.extend(live_row(t) for t in page.get("tests", []))
+            offset += page.get("limit", 200)
+            if offset >= page.get("total", 0):
+                break
+        if rows:
+            progress.dataframe(rows)
+        if run.get("state") == "complete":
+            status.success("Execution finished.")
+            return
+        if run.get("state") == "error":
+            status.error(f"Execution failed: {job.get('error')}")
+            return
+        time.sleep(POLL_INTERVAL)
+    status.warning("Still not finished; use Fetch Report to check on it later.")
+
+def fetch_preview(run_id, key, offset=0, length=2000):
+    """A slice of a text artifact (negative offset: from the end), resolved by the API through the run manifest."""
+    resp = requests.get(f"{API_URL}/preview/{run_id}/{key}", params={"offset": offset, "length": length})
+    return resp.json() if resp.status_code == 200 else None
 
 if "run_id" not in st.session_state:
     st.session_state["run_id"] = None
@@ -39,7 +90,7 @@ if st.button("Rank Top-k"):
         st.warning("Please generate candidates first.")
     else:
         with st.spinner("Ranking candidates..."):
-            resp = requests.post(f"{API_URL}/rank", params={"run_id": rid, "top_k": top_k})
+            resp = requests.post(f"{API_URL}/rank", params={"run_id": rid, "top_k": top_k, "mode": selection_mode})
         if resp.status_code == 200:
             data = resp.json()
             st.success(f"Selected {data.get('selected', 'N/A')} top tests for run {rid}")
@@ -53,131 +104,146 @@ if st.button("Execute"):
         st.warning("Please generate and rank candidates first.")
     else:
         with st.spinner("Executing tests..."):
-            resp = requests.post(f"{API_URL}/execute", params={"run_id": rid})
+            resp = requests.post(f"{API_URL}/execute", params={"run_id": rid, "mode": exec_mode})
         if resp.status_code == 200:
-            st.info("Execution started. Please wait a few seconds before fetching the report.")
+            st.info("Execution queued for a worker (python worker.py). Verdicts appear below as each test finishes.")
+            status = st.empty()
+            status.info("Waiting for a worker to claim the job...")
+            progress = st.empty()
+            live = []
+            finished = False
+            try:
+                with requests.get(f"{API_URL}/report/{rid}/stream", stream=True, timeout=STREAM_TIMEOUT) as stream:
+                    for line in stream.iter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event.get("event") == "started":
+                            status.info(f"Running {event.get('total')} tests...")
+                        elif event.get("event") == "result":
+                            live.append(live_row(event))
+                            progress.dataframe(live)
+                        elif event.get("event") == "retry":
+                            st.warning(f"Attempt {event.get('attempt')} failed, retrying: {event.get('error')}")
+                        elif event.get("event") == "resumed":
+                            status.info(f"Resumed with {event.get('remaining')} tests left")
+                        elif event.get("event") == "done":
+                            status.success(f"Execution finished: {event.get('stats')}")
+                            finished = True
+                        elif event.get("event") == "error":
+                            status.error(f"Execution failed: {event.get('error')}")
+                            finished = True
+            except requests.exceptions.RequestException:
+                pass  # no event within the read timeout (or the stream dropped); poll instead
+            if not finished:
+                poll_execution(rid, status, progress)
         else:
             st.error(f"Error executing tests: {resp.text}")
 
 st.subheader("4️⃣ Fetch Report")
 if st.button("Fetch Report"):
-    rid = st.session_state.get("run_id")
-    if not rid:
+    if not st.session_state.get("run_id"):
         st.warning("Please execute tests first.")
     else:
-        report = None
-        for i in range(5):
-            resp = requests.get(f"{API_URL}/report/{rid}")
-            if resp.status_code == 200:
-                try:
-                    report = resp.json()
-                except Exception as e:
-                    st.error(f"Failed to parse JSON response: {e}")
-                    st.text(resp.text)
-                    report = None
-                break
-            else:
-                st.info(f"Report not ready yet (attempt {i+1}/5)...")
-                time.sleep(2)
-
-        if not report:
-            st.error("❌ Report not found or invalid after retries.")
-        elif isinstance(report, dict) and "summary" in report:
+        # keep showing the report across reruns (paging, filters) until another run is fetched
+        st.session_state["report_run_id"] = st.session_state["run_id"]
+        st.session_state["report_page"] = 1
+
+rid = st.session_state.get("report_run_id")
+if rid:
+    col_verdict, col_triage, col_size = st.columns(3)
+    verdict_filter = col_verdict.selectbox("Verdict", ["all", "pass", "fail"])
+    triage_filter = col_triage.text_input("Triage contains", "")
+    page_size = col_size.selectbox("Tests per page", [10, 25, 50], index=0)
+
+    page_no = st.session_state.get("report_page", 1)
+    params = {"offset": (page_no - 1) * page_size, "limit": page_size}
+    if verdict_filter != "all":
+        params["verdict"] = verdict_filter
+    if triage_filter.strip():
+        params["triage"] = triage_filter.strip()
+    resp = requests.get(f"{API_URL}/report/{rid}/summary", params=params)
+
+    if resp.status_code != 200:
+        st.error("❌ Report not found or invalid. Has execution been started?")
+    else:
+        page = resp.json()
+        stats = page.get("stats", {})
+        if page.get("status") == "running":
+            st.info(f"Run still in progress: {stats.get('total', 0)} tests reported so far.")
+        else:
             st.success("Report fetched successfully ✅")
-
-            st.write("### 📝 Full Report JSON")
-            st.json(report)
-
-            summary = report.get("summary", [])
-            if not summary:
-                st.warning("Report fetched, but summary is empty.")
-            else:
-                flat_summary = []
-                for s in summary:
-                    executor = s.get("executor")
-                    if not executor:
-                        runs = s.get("runs") or s.get("runs_details") or None
-                        if runs and isinstance(runs, list) and len(runs) > 0:
-                            executor = runs[0].get("executor", "unknown")
-                        else:
-                            executor = "unknown"
-
-                    triage_val = s.get("triage", [])
-                    if isinstance(triage_val, list):
-                        triage_str = "; ".join(str(x) for x in triage_val)
-                    else:
-                        triage_str = str(triage_val)
-
-                    artifacts = s.get("artifacts", {}) or {}
-                    flat_summary.append({
-                        "test_id": s.get("test_id"),
-                        "verdict": s.get("verdict"),
-                        "reproducibility": s.get("reproducibility"),
-                        "executor": executor,
-                        "runs_count": s.get("runs_count", None),
-                        "passes": s.get("passes", None),
-                        "triage": triage_str,
-                        "console_log": artifacts.get("console"),
-                        "screenshot": artifacts.get("screenshot"),
-                        "dom": artifacts.get("dom")
-                    })
-
-                st.write("### 📊 Summary Table")
-                st.dataframe(flat_summary)
-
-                stats = report.get("stats", {})
-                if stats:
-                    st.write("### 📈 Pass/Fail Stats")
-                    chart_data = {"Passed": [stats.get("passed", 0)], "Failed": [stats.get("failed", 0)]}
-                    st.bar_chart(chart_data)
-
-                # Show artifacts content (safe)
-                st.write("### 📦 Artifacts")
-                for s in summary:
-                    tid = s.get("test_id")
-                    verdict = s.get("verdict")
-                    st.markdown(f"**Test {tid} ({verdict})**")
-                    artifacts = s.get("artifacts", {}) or {}
-
-                    console_path = artifacts.get("console")
-                    screenshot_path = artifacts.get("screenshot")
-                    dom_path = artifacts.get("dom")
-
-                    if console_path:
-                        p_console = Path(console_path)
-                        if p_console.exists():
-                            with open(p_console, "r", encoding="utf-8") as f:
-                                st.code(f.read(), language="bash")
+        st.markdown(f"[Full report JSON]({API_URL}/report/{rid})")
+
+        if stats:
+            st.write("### 📈 Pass/Fail Stats")
+            st.bar_chart({"Passed": [stats.get("passed", 0)], "Failed": [stats.get("failed", 0)]})
+
+        total = page.get("total", 0)
+        pages = max(1, -(-total // page_size))
+        if page_no > pages:
+            st.session_state["report_page"] = page_no = pages
+        new_page = st.number_input(f"Page (of {pages}, {total} matching tests)", min_value=1, max_value=pages,
+                                   value=page_no, step=1)
+        if new_page != page_no:
+            st.session_state["report_page"] = int(new_page)
+            st.rerun()
+
+        tests = page.get("tests", [])
+        if not tests:
+            st.warning("No tests match the current filters.")
+        else:
+            st.write("### 📊 Summary Table")
+            st.dataframe([{
+                "test_id": t.get("test_id"),
+                "verdict": t.get("verdict"),
+                "reproducibility": t.get("reproducibility"),
+                "executor": t.get("executor") or "unknown",
+                "runs_count": t.get("runs_count"),
+                "passes": t.get("passes"),
+                "triage": "; ".join(str(x) for x in t.get("triage") or []),
+                "error": t.get("error")
+            } for t in tests])
+
+            # artifacts of the tests on this page only: log tail and DOM head previews, screenshot thumbnails
+            st.write("### 📦 Artifacts")
+            for t in tests:
+                tid = t.get("test_id")
+                artifacts = t.get("artifacts") or {}
+                with st.expander(f"Test {tid} ({t.get('verdict')})"):
+                    if not st.checkbox("Load artifacts", key=f"artifacts-{rid}-{tid}"):
+                        continue
+                    console_key = artifacts.get("console")
+                    screenshot_key = artifacts.get("screenshot")
+                    dom_key = artifacts.get("dom")
+
+                    if console_key:
+                        preview = fetch_preview(rid, console_key, offset=-2000)
+                        if preview is not None:
+                            if preview["truncated"]:
+                                st.caption(f"Last {preview['length']} of {preview['size']} bytes")
+                            st.code(preview["text"], language="bash")
+                            st.markdown(f"[Full console log]({API_URL}/artifact/{rid}/{console_key})")
                         else:
-                            st.warning(f"Console log path listed but file not found: {console_path}")
+                            st.warning(f"Console log listed but not found in the run manifest: {console_key}")
                     else:
                         st.info("No console log recorded for this test.")
 
-                    if screenshot_path:
-                        p_shot = Path(screenshot_path)
-                        if p_shot.exists():
-                            st.image(str(p_shot))
+                    if screenshot_key:
+                        thumb = requests.get(f"{API_URL}/thumbnail/{rid}/{screenshot_key}", params={"width": 480})
+                        if thumb.status_code == 200:
+                            st.image(thumb.content)
+                            st.markdown(f"[Full-size screenshot]({API_URL}/artifact/{rid}/{screenshot_key})")
                         else:
-                            st.warning(f"Screenshot path listed but file not found: {screenshot_path}")
+                            st.warning(f"Screenshot listed but not found in the run manifest: {screenshot_key}")
                     else:
                         st.info("No screenshot recorded for this test.")
 
-                    if dom_path:
-                        p_dom = Path(dom_path)
-                        if p_dom.exists():
-                            with open(p_dom, "r", encoding="utf-8") as f:
-                                dom_text = f.read()
-                                st.text(dom_text[:400] + ("\n\n... (truncated)" if len(dom_text) > 400 else ""))
+                    if dom_key:
+                        preview = fetch_preview(rid, dom_key, length=400)
+                        if preview is not None:
+                            st.text(preview["text"] + ("\n\n... (truncated)" if preview["truncated"] else ""))
                         else:
-                            st.warning(f"DOM path listed but file not found: {dom_path}")
+                            st.warning(f"DOM snapshot listed but not found in the run manifest: {dom_key}")
                     else:
                         st.info("No DOM snapshot recorded for this test.")
-
-        else:
-            st.error("❌ Invalid report structure or missing 'summary'.")
-            try:
-                st.text(resp.text)
-            except Exception:
-                pass
-
-
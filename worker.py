@@ -0,0 +1,157 @@
+# worker.py
+"""
+Executor worker: claims execution jobs that the API enqueued (agents/jobs.py), runs
+them outside the API server, and keeps each job's lease alive with heartbeats. Start
+one or more alongside the API:
+
+    python worker.py
+    python worker.py --lease 120 --poll 0.5
+
+A job whose worker dies is reclaimed once its lease expires and resumes from the
+report snapshot of the interrupted attempt; failures are retried with backoff until
+the job's attempts are used up, then the run is marked as errored.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import traceback
+import uuid
+
+from agents import metrics
+from agents.history import TestHistory
+from agents.jobs import JobQueue
+from agents.registry import RunRegistry
+from agents.runner import REPEAT_MODE, RUNS_DIR, append_event, execute_run
+
+# base delay before a failed job is retried; doubles with every attempt
+RETRY_DELAY = float(os.environ.get("JOB_RETRY_DELAY", "5"))
+
+
+class Worker:
+    def __init__(self, lease_seconds: float = 60.0, poll_interval: float = 1.0, jobs: JobQueue = None,
+                 registry: RunRegistry = None, history: TestHistory = None):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.jobs = jobs or JobQueue()
+        self.registry = registry or RunRegistry()
+        self.history = history or TestHistory()
+        self.snapshot_path = os.path.join(metrics.SNAPSHOT_DIR, f"{self.worker_id}.json")
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _log(self, message: str):
+        print(f"[worker {self.worker_id}] {message}", flush=True)
+
+    def _settle_run(self, job: dict, state: str, error: str):
+        """Registry state and stream event for a job that was retried or has failed for good."""
+        run_id = job["run_id"]
+        if state == "queued":
+            self.registry.update(run_id, state="queued")
+            append_event(run_id, {"event": "retry", "run_id": run_id, "attempt": job["attempts"], "error": error})
+        else:
+            self.registry.update(run_id, state="error")
+            append_event(run_id, {"event": "error", "error": error})
+
+    async def _publish_metrics(self):
+        while True:
+            await asyncio.to_thread(metrics.REGISTRY.write_snapshot, self.snapshot_path)
+            await asyncio.sleep(5)
+
+    async def run(self, once: bool = False):
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        publisher = asyncio.create_task(self._publish_metrics())
+        self._log("waiting for jobs")
+        try:
+            while not self._stopping.is_set():
+                for job in await asyncio.to_thread(self.jobs.requeue_stale):
+                    self._log(f"released job {job['job_id']} (run {job['run_id']}): {job['error']} -> {job['state']}")
+                    self._settle_run(job, job["state"], job["error"])
+                job = await asyncio.to_thread(self.jobs.claim, self.worker_id, self.lease_seconds)
+                if job is None:
+                    if once:
+                        return
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run_job(job)
+                if once:
+                    return
+        finally:
+            publisher.cancel()
+            # the last snapshot stays behind: its counters are totals, and its gauges go stale
+            await asyncio.to_thread(metrics.REGISTRY.write_snapshot, self.snapshot_path)
+
+    async def _run_job(self, job: dict):
+        job_id, run_id, payload = job["job_id"], job["run_id"], job["payload"]
+        self._log(f"claimed job {job_id} (run {run_id}, attempt {job['attempts']}/{job['max_attempts']})")
+        task = asyncio.create_task(execute_run(
+            run_id, payload["ranked_path"], self.registry, self.history, mode=payload.get("mode", "async"),
+            processes=payload.get("processes"), repeat_mode=payload.get("repeat_mode") or REPEAT_MODE, job_id=job_id
+        ))
+        stopping = asyncio.create_task(self._stopping.wait())
+        lost_lease = False
+        try:
+            # renew the lease while the run is going; give the job back if asked to stop
+            while not task.done():
+                await asyncio.wait({task, stopping}, timeout=self.lease_seconds / 3,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if task.done():
+                    break
+                if stopping.done():
+                    task.cancel()
+                    break
+                if not await asyncio.to_thread(self.jobs.heartbeat, job_id, self.worker_id, self.lease_seconds):
+                    lost_lease = True
+                    task.cancel()
+                    break
+            try:
+                await task
+            except asyncio.CancelledError:
+                if lost_lease:
+                    self._log(f"lost the lease on job {job_id}; another worker owns it now")
+                else:
+                    await asyncio.to_thread(self.jobs.release, job_id, self.worker_id)
+                    self.registry.update(run_id, state="queued")
+                    self._log(f"released job {job_id} on shutdown")
+                return
+            except Exception as e:
+                error = repr(e)
+                self._log(f"job {job_id} failed: {error}\n{traceback.format_exc()}")
+                state = await asyncio.to_thread(self.jobs.fail, job_id, self.worker_id, error, RETRY_DELAY)
+                if state is not None:
+                    self._settle_run(job, state, error)
+                return
+            await asyncio.to_thread(self.jobs.complete, job_id, self.worker_id)
+            self._log(f"finished job {job_id}")
+        finally:
+            stopping.cancel()
+            await asyncio.to_thread(metrics.REGISTRY.write_snapshot, self.snapshot_path)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued test executions")
+    parser.add_argument("--lease", type=float, default=float(os.environ.get("JOB_LEASE_SECONDS", "60")),
+                        help="seconds a claimed job stays ours without a heartbeat")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between polls when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="run at most one job, then exit")
+    args = parser.parse_args(argv)
+
+    worker = Worker(lease_seconds=args.lease, poll_interval=args.poll)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+    await worker.run(once=args.once)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())